@@ -0,0 +1,76 @@
+"""Serialization cost per listing item, run from the Backend directory:
+
+    python benchmarks/serialization.py [--items 100] [--repeat 200]
+
+Compares the paths a page of projects can take from Mongo documents to
+response bytes:
+
+    model+jsonable_encoder  Project models through jsonable_encoder and json.dumps (before)
+    dict+jsonable_encoder   raw documents through jsonable_encoder and json.dumps (before)
+    lean schema             ProjectPage validated and dumped by pydantic-core
+    orjson                  BSONJSONResponse.render on the raw documents (after)
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from models.project import Project
+from schemas.project import ProjectPage
+from services.project_service import _serialize_list_item
+from utils.serialization import BSONJSONResponse
+
+def make_documents(count: int) -> list:
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "title": f"Clean water for village {index}",
+        "description": "Wells and filtration for households without safe drinking water. " * 4,
+        "owner_email": f"owner{index}@example.com",
+        "images": [f"/uploads/images/{index}.jpg"],
+        "imageVariants": [{"thumb": f"/uploads/images/{index}_thumb.webp", "sizes": {"480": "a.webp", "960": "b.webp"}}],
+        "status": "approved",
+        "category": "Health",
+        "goalAmount": 50000.0,
+        "raisedAmount": 1234.5 * index,
+        "impactScore": index % 100,
+        "supportersCount": index,
+        "uniqueDonorsCount": index,
+        "location": "Pune",
+        "needsVolunteers": index % 2 == 0,
+        "volunteerFormUrl": None,
+        "submitted_at": now - timedelta(days=index),
+    } for index in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Time JSON serialization of project listings")
+    parser.add_argument("--items", type=int, default=100, help="Items per page")
+    parser.add_argument("--repeat", type=int, default=200, help="Pages serialized per measurement")
+    args = parser.parse_args()
+
+    documents = make_documents(args.items)
+    models = [Project(**document) for document in documents]
+    page = {"items": [_serialize_list_item(dict(document)) for document in documents], "next_cursor": "abc"}
+
+    cases = {
+        "model+jsonable_encoder": lambda: json.dumps(jsonable_encoder(models)).encode(),
+        "dict+jsonable_encoder": lambda: json.dumps(jsonable_encoder(page)).encode(),
+        "lean schema": lambda: ProjectPage.model_validate(page).model_dump_json().encode(),
+        "orjson": lambda: BSONJSONResponse(page).body,
+    }
+    baseline = None
+    print(f"{args.items} items per page, best of 5 x {args.repeat} pages")
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=args.repeat, repeat=5)) / args.repeat
+        per_item = seconds / args.items * 1e6
+        baseline = baseline or per_item
+        print(f"{name:<24} {per_item:8.2f} us/item  {seconds * 1000:8.3f} ms/page  {baseline / per_item:6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from utils.broadcast import broadcaster, change_stream_tailer
+from utils.compression import CompressionMiddleware
 from utils.database import connect_to_mongo, close_mongo_connection
+from utils.health import DrainMiddleware, readiness_probe
 from utils.config import settings
+from utils.jobs import job_queue
+from utils.metrics import MetricsMiddleware, registry as metrics_registry
+from utils.tracing import TracingMiddleware, loop_monitor, tracer
+from utils.serialization import BSONJSONResponse
+from utils.static_files import UploadStaticFiles
+from services.google_oauth import connect_google_oauth, close_google_oauth
+from services.payment_gateway import connect_payment_gateway, close_payment_gateway
+from services.ranking_service import RankingService
 from routes.auth import router as auth_router
 from routes.donations import router as donations_router
 from routes.projects import router as projects_router
 from routes.admin import router as admin_router
+from routes.health import router as health_router
 import logging
 
 # Configure logging
@@ -17,11 +30,32 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    tracer.configure()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
     await connect_to_mongo()
+    connect_payment_gateway()
+    connect_google_oauth()
+    await job_queue.start()
+    await RankingService.start()
+    if settings.SSE_SOURCE == "change_stream":
+        await change_stream_tailer.start()
+    # Live streams never finish by themselves; end them when drain starts so clients reconnect elsewhere
+    readiness_probe.on_drain(broadcaster.close)
+    readiness_probe.install_signal_hook()
     logger.info("Application started")
     yield
-    # Shutdown
+    # Shutdown: readiness has failed since the signal and uvicorn has waited for open requests;
+    # this covers servers without the hook, then lets background jobs finish
+    readiness_probe.start_draining()
+    await change_stream_tailer.stop()
+    await RankingService.stop()
+    await job_queue.stop(timeout=settings.SHUTDOWN_DRAIN_SECONDS)
+    await close_google_oauth()
+    close_payment_gateway()
     await close_mongo_connection()
+    loop_monitor.stop()
+    tracer.shutdown()
     logger.info("Application stopped")
 
 # Create FastAPI app
@@ -29,10 +63,13 @@ app = FastAPI(
     title="Authentication API",
     description="FastAPI backend with MongoDB for authentication",
     version="1.0.0",
+    default_response_class=BSONJSONResponse,
     lifespan=lifespan
 )
 
-# Mount static files directory
+# Mount static files directory; uploads get their own mount so they can be cached aggressively
+if settings.UPLOAD_STORAGE_BACKEND == "local":
+    app.mount(f"/{settings.UPLOAD_DIRECTORY}", UploadStaticFiles(directory=settings.UPLOAD_DIRECTORY), name="uploads")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Configure CORS
@@ -44,20 +81,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(TracingMiddleware)
+app.add_middleware(DrainMiddleware)
+app.add_middleware(CompressionMiddleware)
+
+# Added last so it wraps everything else and times the full request
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(donations_router)
 app.include_router(projects_router)
 app.include_router(admin_router)
+app.include_router(health_router)
 
 @app.get("/")
 async def root():
     return {"message": "Authentication API is running!"}
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "message": "API is running properly"}
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus text exposition of this worker's metrics"""
+        return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run(
+        "main:app", host="0.0.0.0", port=8000, reload=True,
+        timeout_graceful_shutdown=settings.SHUTDOWN_DRAIN_SECONDS
+    )
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""Maintenance commands, run from the Backend directory: python manage.py --help"""
+import argparse
+import asyncio
+import logging
+from utils.database import connect_to_mongo, close_mongo_connection, db_connection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("manage")
+
+async def backfill_derivatives(force: bool = False):
+    """Generate thumbnails and responsive sizes for projects uploaded before the pipeline existed"""
+    from services.image_service import ImageService
+
+    query = {"images.0": {"$exists": True}}
+    if not force:
+        query["imageVariants.0"] = {"$exists": False}
+    processed = failed = 0
+    async for project in db_connection.db.get_collection("projects").find(query, {"_id": 1}):
+        try:
+            await ImageService.process_project({"project_id": str(project["_id"]), "force": force})
+            processed += 1
+        except Exception as e:
+            logger.error(f"Failed to process project {project['_id']}: {e}")
+            failed += 1
+    logger.info(f"Backfilled derivatives for {processed} projects ({failed} failed)")
+    return failed == 0
+
+async def reconcile_donations():
+    """Recompute project totals from the donations collection"""
+    from services.donation_service import DonationService
+
+    await DonationService.reconcile_project_totals()
+    return True
+
+async def dedupe_donations():
+    """Remove duplicate donations per payment so the unique index can be built"""
+    from services.donation_service import DonationService
+    from utils.indexes import ensure_indexes
+
+    moved = await DonationService.dedupe_payments()
+    if moved:
+        logger.info("Rebuild derived stats next: --rebuild-user-stats and --rebuild-donor-counts")
+    await ensure_indexes(db_connection.db)
+    return True
+
+async def rebuild_user_stats():
+    """Recompute every donor's stats rollup from the donations collection"""
+    from services.user_service import UserService
+
+    await UserService.rebuild_user_stats()
+    return True
+
+async def rebuild_donor_counts():
+    """Recompute unique donor counters from the donations collection"""
+    from services.project_service import ProjectService
+
+    await ProjectService.rebuild_donor_counts()
+    return True
+
+async def rebuild_trending():
+    """Recompute trending scores from recent donations"""
+    from services.ranking_service import RankingService
+
+    await RankingService.rebuild_trending_scores()
+    return True
+
+async def check_plans():
+    """Explain every registered query shape and fail on collection scans"""
+    # Importing the services registers their job types, which the job claim shape matches
+    import services.donation_service, services.image_service, services.impact_service  # noqa: F401
+    from utils.indexes import check_query_plans
+
+    return await check_query_plans(db_connection.db)
+
+async def run(args) -> bool:
+    # Duplicates would make index creation fail before they could be removed
+    await connect_to_mongo(apply_indexes=not args.dedupe_donations)
+    try:
+        if args.backfill_derivatives:
+            return await backfill_derivatives(force=args.force)
+        if args.dedupe_donations:
+            return await dedupe_donations()
+        if args.reconcile_donations:
+            return await reconcile_donations()
+        if args.rebuild_user_stats:
+            return await rebuild_user_stats()
+        if args.rebuild_donor_counts:
+            return await rebuild_donor_counts()
+        if args.rebuild_trending:
+            return await rebuild_trending()
+        if args.check_plans:
+            return await check_plans()
+        return True
+    finally:
+        await close_mongo_connection()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_mutually_exclusive_group(required=True)
+    commands.add_argument("--backfill-derivatives", action="store_true", help="generate image derivatives for existing uploads")
+    commands.add_argument("--reconcile-donations", action="store_true", help="recompute project totals from donations")
+    commands.add_argument("--dedupe-donations", action="store_true", help="remove duplicate donations per payment before the unique index is built")
+    commands.add_argument("--rebuild-user-stats", action="store_true", help="recompute per-user donation stats rollups")
+    commands.add_argument("--rebuild-donor-counts", action="store_true", help="recompute unique donor counters")
+    commands.add_argument("--rebuild-trending", action="store_true", help="recompute trending scores from recent donations")
+    commands.add_argument("--check-plans", action="store_true", help="fail if any service query shape needs a collection scan")
+    parser.add_argument("--force", action="store_true", help="regenerate derivatives that already exist")
+    args = parser.parse_args()
+    raise SystemExit(0 if asyncio.run(run(args)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # models/project.py
 
+from datetime import datetime
 from pydantic import BaseModel, Field, HttpUrl
 from typing import Optional, List
 from bson import ObjectId
@@ -27,6 +28,7 @@ class Project(BaseModel):
     description: str
     owner_email: str
     images: Optional[List[str]] = []
+    imageVariants: Optional[List[dict]] = []  # Thumbnails and responsive sizes, parallel to images
     pdfDescription: Optional[str] = None
     status: str = "pending"
     category: str
@@ -34,10 +36,16 @@ class Project(BaseModel):
     raisedAmount: float = 0.0
     impactScore: int = 0
     supportersCount: int = 0
+    uniqueDonorsCount: int = 0
     location: str
     needsVolunteers: bool = False
     volunteerFormUrl: Optional[str] = None # Pydantic v2 would use HttpUrl here
     volunteerDescription: Optional[str] = None
+    submitted_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    version: int = 0  # Bumped by every moderation decision, for optimistic concurrency
+    moderated_by: Optional[str] = None
+    moderated_at: Optional[datetime] = None
+    rejectionReason: Optional[str] = None
 
     class Config:
         json_encoders = {ObjectId: str}
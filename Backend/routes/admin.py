@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from typing import Optional
 from schemas.auth import UserLogin
+from schemas.project import BulkModerationRequest, PendingProjectPage
 from services.auth_service import AuthService
 from services.project_service import ProjectService
-from utils.auth import get_current_admin_user, create_access_token
+from utils.auth import get_current_admin_user, create_access_token, build_token_claims
+from utils.conditional import check_not_modified
+from utils.mongo_pool import pool_metrics
+from utils.rate_limit import LOGIN_RULES, rate_limit
+from utils.serialization import BSONJSONResponse
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-@router.post("/login")
+@router.post("/login", dependencies=[Depends(rate_limit(LOGIN_RULES))])
 async def admin_login(user_credentials: UserLogin):
     user = await AuthService.authenticate_user(user_credentials.email, user_credentials.password)
     if not user or user.get("role") != "admin":
@@ -15,15 +21,47 @@ async def admin_login(user_credentials: UserLogin):
             detail="Invalid credentials or not an admin",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user["email"], "role": user.get("role")})
+    access_token = create_access_token(data=build_token_claims(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
-@router.get("/projects/pending")
-async def get_pending_projects(current_user: dict = Depends(get_current_admin_user)):
-    projects = await ProjectService.get_pending_projects()
-    return projects
+@router.get("/projects/pending", response_model=PendingProjectPage)
+async def get_pending_projects(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Moderation queue, oldest submission first; pass next_cursor back to continue"""
+    headers = check_not_modified(request, await ProjectService.pending_projects_version(), private=True)
+    page = await ProjectService.get_pending_projects(limit=limit, cursor=cursor)
+    return BSONJSONResponse(page, headers=headers)
+
+@router.post("/projects/bulk-approve")
+async def bulk_approve_projects(request: BulkModerationRequest, current_user: dict = Depends(get_current_admin_user)):
+    results = await ProjectService.moderate_projects(
+        [item.model_dump() for item in request.items], "approved", current_user["email"]
+    )
+    return {"results": results}
+
+@router.post("/projects/bulk-reject")
+async def bulk_reject_projects(request: BulkModerationRequest, current_user: dict = Depends(get_current_admin_user)):
+    results = await ProjectService.moderate_projects(
+        [item.model_dump() for item in request.items], "rejected", current_user["email"], request.reason
+    )
+    return {"results": results}
 
 @router.put("/projects/{project_id}/approve")
-async def approve_project(project_id: str, current_user: dict = Depends(get_current_admin_user)):
-    await ProjectService.approve_project(project_id)
+async def approve_project(project_id: str, version: Optional[int] = None, current_user: dict = Depends(get_current_admin_user)):
+    [result] = await ProjectService.moderate_projects(
+        [{"id": project_id, "version": version}], "approved", current_user["email"]
+    )
+    if result["result"] == "not_found":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if result["result"] == "conflict":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Project was already moderated")
     return {"status": "success"}
+
+@router.get("/db/pool")
+async def get_db_pool_stats(current_user: dict = Depends(get_current_admin_user)):
+    """MongoDB connection pool usage per server"""
+    return {"pools": pool_metrics.snapshot()}
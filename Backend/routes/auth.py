@@ -1,17 +1,21 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Request, status, Depends
 from fastapi.responses import RedirectResponse
 from schemas.auth import UserLogin, UserRegister, GoogleLogin, Token
 from services.auth_service import AuthService
-from services.user_service import UserService
-from utils.auth import get_current_user
+from services.project_service import ProjectService
+from services.user_service import UserService, user_stats_stamp
+from utils.auth import get_current_user, get_current_principal
+from utils.conditional import check_not_modified
+from utils.rate_limit import LOGIN_RULES, REGISTER_RULES, rate_limit
 from utils.config import settings
+from utils.serialization import BSONJSONResponse
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@router.post("/register", response_model=Token)
+@router.post("/register", response_model=Token, dependencies=[Depends(rate_limit(REGISTER_RULES))])
 async def register(user_data: UserRegister):
     """Register a new user"""
     return await AuthService.register_user(
@@ -20,7 +24,7 @@ async def register(user_data: UserRegister):
         password=user_data.password
     )
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(rate_limit(LOGIN_RULES))])
 async def login(user_data: UserLogin):
     """Login user with email and password"""
     return await AuthService.login_user(
@@ -79,11 +83,17 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     }
 
 @router.get("/me/stats")
-async def get_user_stats(current_user: dict = Depends(get_current_user)):
+async def get_user_stats(request: Request, current_user: dict = Depends(get_current_principal)):
     """Get current user donation stats"""
-    return await UserService.get_user_stats(current_user["email"])
+    email = current_user["email"]
+    # impactPoints follows the supported projects' impactScore, which bumps the listings generation
+    headers = check_not_modified(
+        request, email, await user_stats_stamp.get(email),
+        await ProjectService.approved_projects_version(), private=True
+    )
+    return BSONJSONResponse(await UserService.get_user_stats(email), headers=headers)
 
 @router.post("/verify-token")
-async def verify_token(current_user: dict = Depends(get_current_user)):
+async def verify_token(current_user: dict = Depends(get_current_principal)):
     """Verify if token is valid"""
     return {"valid": True, "user_id": current_user["id"]}
\ No newline at end of file
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from utils.health import readiness_probe
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+async def _readiness_response() -> JSONResponse:
+    result = await readiness_probe.check()
+    status_code = status.HTTP_200_OK if result["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content={"status": result["status"], "checks": result["checks"]})
+
+@router.get("")
+async def health_check():
+    """Kept for existing load balancer configs; same as /health/ready"""
+    return await _readiness_response()
+
+@router.get("/live")
+async def liveness():
+    """The process is up and its event loop is answering; never checks dependencies"""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness():
+    """503 while MongoDB is unreachable, the pool is saturated, the loop is lagging, or during drain"""
+    return await _readiness_response()
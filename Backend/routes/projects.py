@@ -1,19 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File, Form, Query
 from models.project import Project
+from schemas.project import ProjectPage, SearchPage
 from services.project_service import ProjectService
-from services.gemini_service import GeminiService
-from utils.auth import get_current_user
-from typing import List, Optional
-import os
-import shutil
-import json
+from services.impact_service import ImpactService
+from services.image_service import ImageService
+from services.ranking_service import RankingService
+from services.search_service import SearchService
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from utils.auth import get_current_principal
+from utils.broadcast import broadcaster, stream_events
+from utils.conditional import check_not_modified
+from utils.serialization import BSONJSONResponse
+from utils.storage import upload_store
+from typing import List, Literal, Optional
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
-# Create a directory to store uploaded files
-UPLOAD_DIRECTORY = "static/uploads"
-os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
-
 @router.post("/")
 async def submit_project(
     title: str = Form(...),
@@ -26,21 +29,10 @@ async def submit_project(
     volunteerDescription: Optional[str] = Form(None),
     images: List[UploadFile] = File([]),
     pdfDescription: Optional[UploadFile] = File(None),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
-    image_urls = []
-    for image in images:
-        file_location = os.path.join(UPLOAD_DIRECTORY, image.filename)
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(image.file, file_object)
-        image_urls.append(f"/{UPLOAD_DIRECTORY}/{image.filename}")
-
-    pdf_url = None
-    if pdfDescription:
-        file_location = os.path.join(UPLOAD_DIRECTORY, pdfDescription.filename)
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(pdfDescription.file, file_object)
-        pdf_url = f"/{UPLOAD_DIRECTORY}/{pdfDescription.filename}"
+    # Images and the PDF are streamed to storage concurrently, all or nothing
+    image_urls, pdf_url = await upload_store.save_batch(images, pdfDescription)
 
     project_data = Project(
         title=title,
@@ -58,27 +50,102 @@ async def submit_project(
     
     project = await ProjectService.create_project(project_data)
 
-    # Get societal impact analysis from Gemini API
-    impact_analysis_response = GeminiService.get_societal_impact_analysis(project.title, project.description)
-    if impact_analysis_response:
-        try:
-            # Clean the response to extract only the JSON part
-            json_string = impact_analysis_response.strip("```json\n").strip("\n```")
-            impact_analysis_json = json.loads(json_string)
-            impact_score = impact_analysis_json.get('impact_score', 0)
-            await ProjectService.update_project_impact_score(project.id, impact_score)
-            project.impactScore = impact_score
-        except (json.JSONDecodeError, AttributeError) as e:
-            print(f"Error parsing impact analysis response: {e}")
+    # Societal impact is scored in the background; impactScore is filled in later
+    await ImpactService.queue_analysis(str(project.id))
+    if image_urls:
+        await ImageService.queue_derivatives(str(project.id))
 
     return project
 
-@router.get("/")
-async def get_projects():
-    projects = await ProjectService.get_approved_projects()
-    return projects
+@router.get("/", response_model=ProjectPage)
+async def get_projects(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    sort: Literal["newest", "raised"] = "newest",
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    needsVolunteers: Optional[bool] = None
+):
+    """List approved projects one page at a time; pass next_cursor back to continue"""
+    headers = check_not_modified(request, await ProjectService.approved_projects_version())
+    page = await ProjectService.get_approved_projects(
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+        category=category,
+        location=location,
+        needs_volunteers=needsVolunteers
+    )
+    return BSONJSONResponse(page, headers=headers)
+
+@router.get("/search", response_model=SearchPage)
+async def search_projects(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    needsVolunteers: Optional[bool] = None
+):
+    """Full-text search over approved projects with facet counts"""
+    results = await SearchService.search(
+        q,
+        limit=limit,
+        cursor=cursor,
+        category=category,
+        location=location,
+        needs_volunteers=needsVolunteers
+    )
+    return BSONJSONResponse(results)
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    metric: Literal["impact", "raised", "supporters", "trending"] = "trending",
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50)
+):
+    """Top approved projects by a metric, overall or within a category or location"""
+    items = await RankingService.get_leaderboard(metric, category, location, limit)
+    return BSONJSONResponse({"metric": metric, "items": items})
+
+@router.get("/donor-counts")
+async def get_donor_counts(ids: str = Query(..., description="Comma-separated project IDs"), approximate: bool = False):
+    """Unique donor counts for many projects in one request"""
+    project_ids = [pid.strip() for pid in ids.split(",") if pid.strip()]
+    if len(project_ids) > 100:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At most 100 project IDs per request")
+    donor_counts = await ProjectService.get_donor_counts(project_ids, approximate)
+    return {"donor_counts": donor_counts}
+
+@router.get("/stream")
+async def stream_progress(ids: Optional[str] = Query(None, description="Comma-separated project IDs; omit to follow every project")):
+    """Server-sent events with funding totals as donations are applied"""
+    project_ids = [pid.strip() for pid in ids.split(",") if pid.strip()] if ids else []
+    if len(project_ids) > 100:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At most 100 project IDs per stream")
+    subscription = broadcaster.subscribe(project_ids)
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live streams, retry later",
+            headers={"Retry-After": "30"}
+        )
+    try:
+        snapshot = await ProjectService.get_live_totals(project_ids) if project_ids else []
+    except Exception:
+        broadcaster.unsubscribe(subscription)
+        raise
+    return StreamingResponse(
+        stream_events(subscription, snapshot),
+        media_type="text/event-stream",
+        # Stop proxies such as nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(broadcaster.unsubscribe, subscription)
+    )
 
 @router.get("/{project_id}/donor-count")
-async def get_donor_count(project_id: str):
-    donor_count = await ProjectService.get_donor_count_for_project(project_id)
+async def get_donor_count(project_id: str, approximate: bool = False):
+    donor_count = await ProjectService.get_donor_count_for_project(project_id, approximate)
     return {"donor_count": donor_count}
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, List
+from typing import Dict, List, Optional, Union
 
 class ProjectCreate(BaseModel):
     title: str
@@ -12,4 +13,69 @@ class ProjectCreate(BaseModel):
     location: str
     needsVolunteers: bool = False
     volunteerFormUrl: Optional[str] = None
-    volunteerDescription: Optional[str] = None
\ No newline at end of file
+    volunteerDescription: Optional[str] = None
+
+class ModerationItem(BaseModel):
+    id: str
+    version: Optional[int] = None  # Version the moderator saw; omit to skip the check
+
+class BulkModerationRequest(BaseModel):
+    items: List[ModerationItem] = Field(..., min_length=1, max_length=500)
+    reason: Optional[str] = None
+
+# Lean response schemas for list endpoints. They document the payloads in
+# OpenAPI; the handlers return documents directly instead of validating
+# each item through them.
+class ProjectListItem(BaseModel):
+    id: str
+    title: str
+    description: str
+    images: List[str] = []
+    imageVariants: List[dict] = []
+    status: str
+    category: str
+    goalAmount: float
+    raisedAmount: float = 0.0
+    impactScore: int = 0
+    supportersCount: int = 0
+    uniqueDonorsCount: int = 0
+    location: str
+    needsVolunteers: bool = False
+    volunteerFormUrl: Optional[str] = None
+
+class ProjectPage(BaseModel):
+    items: List[ProjectListItem]
+    next_cursor: Optional[str] = None
+
+class FacetBucket(BaseModel):
+    value: Optional[Union[str, bool]] = None
+    count: int
+
+class SearchResultItem(ProjectListItem):
+    score: float
+
+class SearchPage(BaseModel):
+    items: List[SearchResultItem]
+    next_cursor: Optional[str] = None
+    facets: Optional[Dict[str, List[FacetBucket]]] = None  # First page only
+    total: Optional[int] = None  # First page only
+
+class PendingProjectItem(BaseModel):
+    id: str
+    title: str
+    description: str
+    owner_email: str
+    images: List[str] = []
+    pdfDescription: Optional[str] = None
+    category: str
+    goalAmount: float
+    location: str
+    needsVolunteers: bool = False
+    volunteerFormUrl: Optional[str] = None
+    volunteerDescription: Optional[str] = None
+    submitted_at: Optional[datetime] = None
+    version: int = 0
+
+class PendingProjectPage(BaseModel):
+    items: List[PendingProjectItem]
+    next_cursor: Optional[str] = None
@@ -1,26 +1,43 @@
-import razorpay
 from fastapi import HTTPException, status
 from utils.config import settings
 from schemas.donation import Donation, DonationOrder
 from utils.database import get_database
+from services.project_service import ProjectService
+from services.payment_gateway import CircuitOpenError, get_payment_gateway
+from services.user_service import UserService
+from services.ranking_service import RankingService
 from bson import ObjectId
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from utils.broadcast import broadcaster
+from utils.jobs import job_queue
+from utils.tracing import traced_service
 import logging
 
 logger = logging.getLogger(__name__)
 
+RECONCILE_DONATIONS_JOB = "reconcile_donations"
+
+@traced_service
 class DonationService:
     @staticmethod
     async def create_order(donation: DonationOrder, currency: str = "INR"):
         """Create a Razorpay order"""
         try:
-            client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
             order_data = {
                 "amount": int(donation.amount * 100),  # Amount in paise
                 "currency": currency,
                 "payment_capture": 1
             }
-            order = client.order.create(data=order_data)
+            order = await get_payment_gateway().create_order(order_data)
             return order
+        except CircuitOpenError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Payment gateway is temporarily unavailable",
+                headers={"Retry-After": str(int(settings.PAYMENT_GATEWAY_RESET_SECONDS))}
+            )
         except Exception as e:
             logger.error(f"Error creating Razorpay order: {e}")
             raise HTTPException(
@@ -31,16 +48,8 @@ class DonationService:
     @staticmethod
     async def verify_payment(razorpay_order_id: str, razorpay_payment_id: str, razorpay_signature: str):
         """Verify a Razorpay payment"""
-        try:
-            client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-            params_dict = {
-                'razorpay_order_id': razorpay_order_id,
-                'razorpay_payment_id': razorpay_payment_id,
-                'razorpay_signature': razorpay_signature
-            }
-            client.utility.verify_payment_signature(params_dict)
-        except Exception as e:
-            logger.error(f"Error verifying Razorpay payment: {e}")
+        if not get_payment_gateway().verify_payment_signature(razorpay_order_id, razorpay_payment_id, razorpay_signature):
+            logger.error(f"Invalid Razorpay signature for payment {razorpay_payment_id}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid payment signature"
@@ -48,7 +57,12 @@ class DonationService:
 
     @staticmethod
     async def save_donation(donation_data: Donation, razorpay_payment_id: str):
-        """Save donation details to the database and update project's raised amount"""
+        """Record a donation exactly once per payment and apply it to the project's counters.
+
+        The donation document doubles as an outbox entry: its counter_state moves
+        pending -> applying -> applied, so a retried or concurrent request for
+        the same payment can never apply the counters twice.
+        """
         try:
             db = await get_database()
             donations_collection = db.donations
@@ -57,21 +71,192 @@ class DonationService:
             donation_data.transaction_id = razorpay_payment_id
             donation_data.currency = "INR"
 
-            await donations_collection.insert_one(donation_data.dict())
-
-            # Update the project's raised amount, supporters count, and impact score
-            projects_collection = db.projects
-            await projects_collection.update_one(
-                {"_id": ObjectId(donation_data.project_id)},
-                {"$inc": {
-                    "raisedAmount": donation_data.amount,
-                    "supportersCount": 1,
-                    "impactScore": int(donation_data.amount / 10) # Increment impact score by 1 for every 10 units of donation
-                }}
-            )
+            donation = donation_data.dict()
+            donation["counter_state"] = "pending"
+            # Server time; donated_at comes from the client and cannot be trusted for staleness
+            donation["recorded_at"] = datetime.utcnow()
+            try:
+                await donations_collection.insert_one(donation)
+            except DuplicateKeyError:
+                logger.info(f"Donation for payment {razorpay_payment_id} already recorded")
+                # $type matches the unique index's partial filter, so the planner can use it
+                donation = await donations_collection.find_one(
+                    {"transaction_id": {"$eq": razorpay_payment_id, "$type": "string"}}
+                )
+
+            await DonationService._apply_counters(db, donation)
         except Exception as e:
             logger.error(f"Error saving donation to database: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to save donation"
             )
+
+    @staticmethod
+    async def _apply_counters(db, donation: dict):
+        """Apply a recorded donation to its project, unless another request already claimed it"""
+        claimed = await db.donations.find_one_and_update(
+            {"_id": donation["_id"], "counter_state": "pending"},
+            {"$set": {"counter_state": "applying", "counter_claimed_at": datetime.utcnow()}}
+        )
+        if claimed is None:
+            return
+
+        # Update the project's raised amount, supporters count, and impact score
+        totals = await db.projects.find_one_and_update(
+            {"_id": ObjectId(donation["project_id"])},
+            {"$inc": {
+                "raisedAmount": donation["amount"],
+                "supportersCount": 1,
+                "impactScore": int(donation["amount"] / 10) # Increment impact score by 1 for every 10 units of donation
+            }},
+            projection={"raisedAmount": 1, "supportersCount": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if totals is not None and settings.SSE_SOURCE == "local":
+            broadcaster.publish(
+                donation["project_id"], totals, {"raisedAmount": donation["amount"], "supportersCount": 1}
+            )
+        await DonationService._apply_rollups(db, donation)
+
+    @staticmethod
+    async def _apply_rollups(db, donation: dict):
+        """Fold a donation into the donor, user and trending rollups, then mark it applied.
+
+        Each write is idempotent per donation, so reconcile can re-drive a
+        donation that stopped part way through.
+        """
+        donation_id = str(donation["_id"])
+        await ProjectService.record_donor(donation)
+        if donation.get("email"):
+            await UserService.record_donation(donation["email"], donation["project_id"], donation["amount"], donation_id)
+        await RankingService.record_donation(donation["project_id"], donation["amount"], donation_id)
+        await db.donations.update_one({"_id": donation["_id"]}, {"$set": {"counter_state": "applied"}})
+        await ProjectService.invalidate_approved_projects()
+
+    @staticmethod
+    async def _redrive_stale(db) -> int:
+        """Finish outbox entries stuck past the grace period by a crash or an error.
+
+        Pending entries never touched the project and are applied from the
+        start. Applying entries may or may not have, so only their rollups are
+        replayed; the project totals are recomputed afterwards anyway.
+        """
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=settings.DONATION_OUTBOX_GRACE_SECONDS)
+        redriven = 0
+        # Entries recorded before recorded_at existed are old enough to count as stale
+        async for donation in db.donations.find({"counter_state": "pending", "recorded_at": {"$not": {"$gte": stale_before}}}):
+            try:
+                await DonationService._apply_counters(db, donation)
+                redriven += 1
+            except Exception as e:
+                logger.error(f"Error re-driving donation {donation['_id']}: {e}")
+        async for donation in db.donations.find({"counter_state": "applying", "counter_claimed_at": {"$lt": stale_before}}):
+            # Renew the claim so a concurrent reconcile leaves this entry alone
+            claimed = await db.donations.find_one_and_update(
+                {"_id": donation["_id"], "counter_state": "applying", "counter_claimed_at": donation["counter_claimed_at"]},
+                {"$set": {"counter_claimed_at": now}}
+            )
+            if claimed is None:
+                continue
+            try:
+                await DonationService._apply_rollups(db, donation)
+                redriven += 1
+            except Exception as e:
+                logger.error(f"Error re-driving donation {donation['_id']}: {e}")
+        if redriven:
+            logger.warning(f"Re-drove {redriven} stuck donation outbox entries")
+        return redriven
+
+    @staticmethod
+    async def reconcile_project_totals() -> int:
+        """Re-drive stuck outbox entries, then recompute raisedAmount and supportersCount from donations.
+
+        Project totals are read before anything else. A project that still has
+        donations in flight is skipped, since those may already be in its
+        totals but not yet among the applied donations. Anything applied after
+        the totals were read makes the compare-and-set miss. Either way the
+        project is corrected on a later run. Returns the number of projects corrected.
+        """
+        db = await get_database()
+        await DonationService._redrive_stale(db)
+
+        observed = {}
+        async for project in db.projects.find({}, {"raisedAmount": 1, "supportersCount": 1}):
+            observed[project["_id"]] = (project.get("raisedAmount", 0), project.get("supportersCount", 0))
+        in_flight = set(await db.donations.distinct(
+            "project_id", {"counter_state": {"$in": ["pending", "applying"]}}
+        ))
+        totals = await db.donations.aggregate([
+            # Donations recorded before the outbox existed have no counter_state
+            {"$match": {"status": "completed", "counter_state": {"$in": ["applied", None]}}},
+            {"$group": {"_id": "$project_id", "raisedAmount": {"$sum": "$amount"}, "supportersCount": {"$sum": 1}}}
+        ]).to_list(length=None)
+
+        operations = []
+        for total in totals:
+            if total["_id"] in in_flight or not ObjectId.is_valid(total["_id"]):
+                continue
+            project_id = ObjectId(total["_id"])
+            if project_id not in observed:
+                continue
+            expected = (total["raisedAmount"], total["supportersCount"])
+            if observed[project_id] == expected:
+                continue
+            operations.append(UpdateOne(
+                {"_id": project_id, "raisedAmount": observed[project_id][0], "supportersCount": observed[project_id][1]},
+                {"$set": {"raisedAmount": expected[0], "supportersCount": expected[1]}}
+            ))
+
+        corrected = 0
+        if operations:
+            result = await db.projects.bulk_write(operations, ordered=False)
+            corrected = result.modified_count
+            await ProjectService.invalidate_approved_projects()
+        logger.info(f"Reconciled donation totals: {corrected} of {len(operations)} drifted projects corrected")
+        return corrected
+
+    @staticmethod
+    async def dedupe_payments() -> int:
+        """Keep one donation per gateway payment, moving the rest to donations_duplicates.
+
+        Needed once before the unique transaction_id index can be built on data
+        recorded without it. The copy kept is the earliest one already applied,
+        else the earliest. Totals are reconciled afterwards; returns the number moved.
+        """
+        db = await get_database()
+        groups = await db.donations.aggregate([
+            {"$match": {"transaction_id": {"$type": "string"}}},
+            {"$sort": {"_id": 1}},
+            {"$group": {
+                "_id": "$transaction_id",
+                "donations": {"$push": {"_id": "$_id", "counter_state": "$counter_state"}},
+                "count": {"$sum": 1}
+            }},
+            {"$match": {"count": {"$gt": 1}}}
+        ], allowDiskUse=True).to_list(length=None)
+
+        moved = 0
+        for group in groups:
+            donations = group["donations"]
+            applied = [d for d in donations if d.get("counter_state") in ("applied", None)]
+            keep = (applied or donations)[0]["_id"]
+            for duplicate in donations:
+                if duplicate["_id"] == keep:
+                    continue
+                document = await db.donations.find_one({"_id": duplicate["_id"]})
+                if document is None:
+                    continue
+                await db.donations_duplicates.replace_one({"_id": document["_id"]}, document, upsert=True)
+                await db.donations.delete_one({"_id": document["_id"]})
+                moved += 1
+        logger.info(f"Moved {moved} duplicate donations from {len(groups)} payments to donations_duplicates")
+        if moved:
+            await DonationService.reconcile_project_totals()
+        return moved
+
+async def _reconcile_job(payload: dict):
+    await DonationService.reconcile_project_totals()
+
+job_queue.register(RECONCILE_DONATIONS_JOB, _reconcile_job, every=settings.DONATION_RECONCILE_INTERVAL_SECONDS)
@@ -1,35 +1,65 @@
 import json
+import hashlib
 import google.generativeai as genai
 from utils.config import settings
+from utils.metrics import IMPACT_ANALYSIS_DURATION
+from utils.tracing import traced_service
 
 genai.configure(api_key=settings.GEMINI_KEY)
 
+IMPACT_PROMPT = """
+Analyze the societal impact of a project titled "{project_title}"
+with the following description: "{project_description}".
+
+Respond ONLY in strict JSON format with the following keys:
+- "impact_analysis": string
+- "impact_score": integer (1-100)
+"""
+
+def parse_impact_response(raw_text: str) -> dict:
+    """Parse the model's JSON reply, tolerating a ```json fenced block"""
+    raw_text = raw_text.strip()
+    # Sometimes Gemini wraps JSON in ```json ... ```
+    if raw_text.startswith("```"):
+        raw_text = raw_text.strip("`").replace("json", "", 1).strip()
+    analysis = json.loads(raw_text)
+    analysis["impact_score"] = int(analysis.get("impact_score", 0))
+    return analysis
+
+class GeminiImpactModel:
+    """Scores projects with the Gemini API"""
+
+    def __init__(self, model_name: str = "gemini-pro"):
+        self.model = genai.GenerativeModel(model_name)
+
+    async def analyze(self, project_title: str, project_description: str) -> dict:
+        prompt = IMPACT_PROMPT.format(project_title=project_title, project_description=project_description)
+        response = await self.model.generate_content_async(prompt)
+        return parse_impact_response(response.text)
+
+class StubImpactModel:
+    """Deterministic stand-in for Gemini, used in tests and offline development"""
+
+    async def analyze(self, project_title: str, project_description: str) -> dict:
+        digest = hashlib.sha256(f"{project_title}\n{project_description}".encode()).digest()
+        return {"impact_analysis": "Stub analysis", "impact_score": digest[0] % 100 + 1}
+
+@traced_service
 class GeminiService:
+    _model = None
+
+    @staticmethod
+    def get_model():
+        """Get the configured impact model client, creating it on first use"""
+        if GeminiService._model is None:
+            if settings.IMPACT_MODEL == "stub":
+                GeminiService._model = StubImpactModel()
+            else:
+                GeminiService._model = GeminiImpactModel()
+        return GeminiService._model
+
     @staticmethod
-    def get_societal_impact_analysis(project_title: str, project_description: str) -> dict:
-        """Get societal impact analysis from Gemini API"""
-        try:
-            model = genai.GenerativeModel("gemini-pro")
-            
-            prompt = f"""
-            Analyze the societal impact of a project titled "{project_title}" 
-            with the following description: "{project_description}".
-            
-            Respond ONLY in strict JSON format with the following keys:
-            - "impact_analysis": string
-            - "impact_score": integer (1-100)
-            """
-
-            response = model.generate_content(prompt)
-
-            # Clean + parse JSON
-            raw_text = response.text.strip()
-            # Sometimes Gemini wraps JSON in ```json ... ```
-            if raw_text.startswith("```"):
-                raw_text = raw_text.strip("`").replace("json", "", 1).strip()
-
-            return json.loads(raw_text)
-
-        except Exception as e:
-            print(f"Error getting societal impact analysis: {e}")
-            return {"impact_analysis": "Error generating analysis", "impact_score": 0}
+    async def get_societal_impact_analysis(project_title: str, project_description: str) -> dict:
+        """Get societal impact analysis from the configured model; errors propagate so callers can retry"""
+        with IMPACT_ANALYSIS_DURATION.time(settings.IMPACT_MODEL):
+            return await GeminiService.get_model().analyze(project_title, project_description)
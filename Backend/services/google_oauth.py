@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Optional
+import httpx
+from jose import jwt
+from jose.exceptions import JOSEError
+from utils.config import settings
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+class GoogleOAuthError(Exception):
+    """The code exchange or ID token verification failed"""
+
+class JWKSCache:
+    """Google's signing keys, kept for as long as the certs response's Cache-Control allows.
+
+    Concurrent refreshes collapse into one request. A token signed with an
+    unknown key id forces an early refresh, since Google may have rotated
+    keys, but at most once per JWKS_MIN_REFRESH_SECONDS so forged key ids
+    cannot turn every login into a certs fetch.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._keys: Dict[str, dict] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, client: httpx.AsyncClient, kid: str) -> dict:
+        now = time.monotonic()
+        stale = now >= self._expires_at
+        unknown = kid not in self._keys and now - self._fetched_at >= settings.JWKS_MIN_REFRESH_SECONDS
+        if stale or unknown:
+            async with self._lock:
+                # Another login may have refreshed the keys while this one waited
+                if time.monotonic() >= self._expires_at or (kid not in self._keys and self._fetched_at <= now):
+                    await self._refresh(client)
+        key = self._keys.get(kid)
+        if key is None:
+            raise GoogleOAuthError(f"ID token signed with unknown key {kid}")
+        return key
+
+    async def _refresh(self, client: httpx.AsyncClient):
+        with span("google_oauth.fetch_certs"):
+            response = await client.get(self.url)
+            response.raise_for_status()
+        match = MAX_AGE.search(response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else settings.JWKS_DEFAULT_MAX_AGE_SECONDS
+        self._keys = {key["kid"]: key for key in response.json()["keys"]}
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + max_age
+        logger.info(f"Fetched {len(self._keys)} Google signing keys, cached for {max_age}s")
+
+class GoogleOAuthClient:
+    """Long-lived async client for Google's token endpoint, with pooled connections and cached certs"""
+
+    def __init__(self):
+        self.http = httpx.AsyncClient(
+            timeout=settings.GOOGLE_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=settings.GOOGLE_HTTP_POOL_SIZE)
+        )
+        self.jwks = JWKSCache(settings.GOOGLE_CERTS_URL)
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def exchange_code(self, code: str) -> dict:
+        """Trade an authorization code for Google's token response"""
+        with span("google_oauth.exchange_code"):
+            try:
+                response = await self.http.post(settings.GOOGLE_TOKEN_URL, data={
+                    "client_id": settings.GOOGLE_CLIENT_ID,
+                    "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                    "code": code,
+                    "grant_type": "authorization_code",
+                    "redirect_uri": settings.GOOGLE_REDIRECT_URI,
+                })
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                raise GoogleOAuthError(f"Code exchange failed: {e}")
+        return response.json()
+
+    async def verify_id_token(self, token: str, access_token: Optional[str] = None) -> dict:
+        """Check the ID token's signature, audience, issuer and expiry locally; returns its claims"""
+        try:
+            header = jwt.get_unverified_header(token)
+            key = await self.jwks.get(self.http, header.get("kid"))
+            return jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=settings.GOOGLE_CLIENT_ID,
+                issuer=settings.GOOGLE_ISSUERS.split(","),
+                # Tokens from the code exchange carry at_hash, bound to the access token
+                access_token=access_token,
+            )
+        except httpx.HTTPError as e:
+            raise GoogleOAuthError(f"Could not fetch Google signing keys: {e}")
+        except JOSEError as e:
+            raise GoogleOAuthError(f"Invalid ID token: {e}")
+
+class GoogleOAuthConnection:
+    client: Optional[GoogleOAuthClient] = None
+
+google_oauth_connection = GoogleOAuthConnection()
+
+def get_google_oauth() -> GoogleOAuthClient:
+    if google_oauth_connection.client is None:
+        raise RuntimeError("Google OAuth client is not initialised; connect_google_oauth() runs at startup")
+    return google_oauth_connection.client
+
+def connect_google_oauth():
+    """Create the shared Google OAuth client; called from the application lifespan"""
+    google_oauth_connection.client = GoogleOAuthClient()
+    logger.info("Google OAuth client created")
+
+async def close_google_oauth():
+    if google_oauth_connection.client is not None:
+        await google_oauth_connection.client.close()
+        google_oauth_connection.client = None
+        logger.info("Google OAuth client closed")
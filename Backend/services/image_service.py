@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import io
+import logging
+import uuid
+from typing import Dict, List
+from bson import ObjectId
+from PIL import Image, ImageOps
+from services.project_service import ProjectService
+from utils.config import settings
+from utils.database import db_connection
+from utils.jobs import job_queue
+from utils.storage import upload_store
+from utils.tracing import traced_service
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DERIVATIVES_JOB = "image_derivatives"
+
+# Pillow format name, file extension and content type for each derivative encoding
+DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+}
+
+# Bump when rendering changes in a way the settings below do not capture
+DERIVATIVE_RENDER_VERSION = 1
+
+def _derivative_widths() -> List[int]:
+    return sorted({int(width) for width in settings.IMAGE_DERIVATIVE_WIDTHS.split(",") if width.strip()})
+
+def _render_params_hash(salt: str = "") -> str:
+    """Short hash of everything that shapes a derivative, so changed settings produce new keys"""
+    params = (
+        DERIVATIVE_RENDER_VERSION,
+        settings.IMAGE_THUMBNAIL_SIZE,
+        settings.IMAGE_DERIVATIVE_QUALITY,
+        tuple(sorted(DERIVATIVE_FORMATS)),
+        salt,
+    )
+    return hashlib.sha256(repr(params).encode()).hexdigest()[:12]
+
+def _render_derivatives(source: bytes) -> Dict[str, Dict[str, bytes]]:
+    """Encode the thumbnail and every responsive width; CPU-bound, so run it off the event loop"""
+    with Image.open(io.BytesIO(source)) as original:
+        original = ImageOps.exif_transpose(original)
+        original = original.convert("RGB")
+
+        targets = {"thumbnail": ImageOps.fit(original, (settings.IMAGE_THUMBNAIL_SIZE, settings.IMAGE_THUMBNAIL_SIZE))}
+        for width in _derivative_widths():
+            # Never upscale; small originals are re-encoded at their own width, once
+            width = min(width, original.width)
+            if f"w{width}" in targets:
+                continue
+            height = round(original.height * width / original.width)
+            targets[f"w{width}"] = original.resize((width, height), Image.LANCZOS)
+
+        rendered = {}
+        for name, image in targets.items():
+            rendered[name] = {}
+            for encoding, (pil_format, _, _) in DERIVATIVE_FORMATS.items():
+                buffer = io.BytesIO()
+                image.save(buffer, pil_format, quality=settings.IMAGE_DERIVATIVE_QUALITY)
+                rendered[name][encoding] = buffer.getvalue()
+        return rendered
+
+@traced_service
+class ImageService:
+    @staticmethod
+    async def queue_derivatives(project_id: str, force: bool = False) -> str:
+        """Queue thumbnail and responsive-size generation for a project's images"""
+        return await job_queue.enqueue(IMAGE_DERIVATIVES_JOB, {"project_id": project_id, "force": force})
+
+    @staticmethod
+    async def create_derivatives(image_url: str, force: bool = False) -> dict:
+        """Generate and store derivatives of one uploaded image, returning their URLs.
+
+        Keys depend on the source bytes and the render settings, so existing
+        derivatives are reused. Their URLs are served as immutable, so force
+        never overwrites one: it renders under fresh keys instead.
+        """
+        backend = upload_store.backend
+        source_key = backend.key_for_url(image_url)
+        if source_key is None:
+            raise ValueError(f"Image is not in upload storage: {image_url}")
+        source = await backend.read(source_key)
+        source_hash = hashlib.sha256(source).hexdigest()
+        params_hash = _render_params_hash(uuid.uuid4().hex if force else "")
+
+        rendered = await asyncio.to_thread(_render_derivatives, source)
+        variants = {"source": image_url, "sizes": {}}
+        for name, encodings in rendered.items():
+            urls = {}
+            for encoding, data in encodings.items():
+                _, extension, content_type = DERIVATIVE_FORMATS[encoding]
+                key = f"{source_hash}_{params_hash}_{name}{extension}"
+                if not await backend.exists(key):
+                    await backend.put_bytes(key, data, content_type)
+                urls[encoding] = backend.url_for(key)
+            if name == "thumbnail":
+                variants["thumbnail"] = urls
+            else:
+                variants["sizes"][name[1:]] = urls
+        return variants
+
+    @staticmethod
+    async def process_project(payload: dict):
+        """Job handler: build derivatives for every image on a project and record them"""
+        project_id = payload["project_id"]
+        projects = db_connection.db.get_collection("projects")
+        project = await projects.find_one({"_id": ObjectId(project_id)}, {"images": 1})
+        if project is None:
+            logger.warning(f"Skipping image derivatives for missing project {project_id}")
+            return
+        force = payload.get("force", False)
+        variants = [await ImageService.create_derivatives(url, force) for url in project.get("images") or []]
+        await projects.update_one({"_id": ObjectId(project_id)}, {"$set": {"imageVariants": variants}})
+        await ProjectService.invalidate_approved_projects()
+        logger.info(f"Generated derivatives for {len(variants)} images of project {project_id}")
+
+job_queue.register(IMAGE_DERIVATIVES_JOB, ImageService.process_project)
@@ -0,0 +1,40 @@
+import logging
+from bson import ObjectId
+from services.gemini_service import GeminiService
+from services.project_service import ProjectService
+from utils.config import settings
+from utils.database import db_connection
+from utils.jobs import job_queue
+from utils.tracing import traced_service
+
+logger = logging.getLogger(__name__)
+
+IMPACT_ANALYSIS_JOB = "impact_analysis"
+
+@traced_service
+class ImpactService:
+    @staticmethod
+    async def queue_analysis(project_id: str) -> str:
+        """Queue a background impact analysis for a newly submitted project"""
+        return await job_queue.enqueue(IMPACT_ANALYSIS_JOB, {"project_id": project_id})
+
+    @staticmethod
+    async def score_project(payload: dict):
+        """Job handler: score a project with the impact model and store the result"""
+        project_id = payload["project_id"]
+        project = await db_connection.db.get_collection("projects").find_one(
+            {"_id": ObjectId(project_id)},
+            {"title": 1, "description": 1}
+        )
+        if project is None:
+            logger.warning(f"Skipping impact analysis for missing project {project_id}")
+            return
+        analysis = await GeminiService.get_societal_impact_analysis(project["title"], project["description"])
+        await ProjectService.update_project_impact_score(project_id, analysis["impact_score"])
+        logger.info(f"Scored project {project_id}: {analysis['impact_score']}")
+
+job_queue.register(
+    IMPACT_ANALYSIS_JOB,
+    ImpactService.score_project,
+    timeout=settings.IMPACT_ANALYSIS_TIMEOUT_SECONDS
+)
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import razorpay
+import requests
+from requests.adapters import HTTPAdapter
+from utils.config import settings
+from utils.metrics import PAYMENT_GATEWAY_DURATION
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the gateway while it is considered down"""
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single trial call through after a cool-down"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_in_flight):
+            raise CircuitOpenError("Payment gateway circuit is open")
+        if state == "half-open":
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def end_call(self):
+        """Release the half-open trial slot even if the call recorded no outcome (e.g. it was cancelled)"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Payment gateway circuit opened")
+            self.opened_at = time.monotonic()
+
+# Failures worth retrying: the request may not have reached the gateway, or it
+# failed on the gateway's side
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, razorpay.errors.ServerError)
+# The gateway answered, so it is up even though the request was refused
+CLIENT_ERRORS = (razorpay.errors.BadRequestError, razorpay.errors.GatewayError)
+
+class PaymentGateway:
+    """Long-lived Razorpay client with pooled connections, off-loop calls, retries and a circuit breaker"""
+
+    def __init__(self, key_id: str, key_secret: str):
+        self.key_secret = key_secret
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.PAYMENT_GATEWAY_POOL_SIZE
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        options = {"base_url": settings.RAZORPAY_BASE_URL} if settings.RAZORPAY_BASE_URL else {}
+        self.client = razorpay.Client(session=self.session, auth=(key_id, key_secret), **options)
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.PAYMENT_GATEWAY_POOL_SIZE,
+            thread_name_prefix="payment-gateway"
+        )
+        self.breaker = CircuitBreaker(
+            settings.PAYMENT_GATEWAY_FAILURE_THRESHOLD,
+            settings.PAYMENT_GATEWAY_RESET_SECONDS
+        )
+
+    async def _call(self, func: Callable, *args, lookup: Optional[Callable] = None, **kwargs):
+        """Run a blocking SDK call on the gateway's thread pool with retry and circuit breaking.
+
+        For calls that are not idempotent, pass `lookup`: before retrying a
+        request that may already have reached the gateway, it is called to
+        find what the earlier attempt created, and its result is returned
+        instead of repeating the call.
+        """
+        loop = asyncio.get_running_loop()
+        attempts = settings.PAYMENT_GATEWAY_MAX_ATTEMPTS
+        operation = getattr(func, "__qualname__", "call")
+        for attempt in range(1, attempts + 1):
+            self.breaker.before_call()
+            try:
+                with PAYMENT_GATEWAY_DURATION.time(operation), span(f"payment_gateway.{operation}", attempt=attempt):
+                    result = await loop.run_in_executor(
+                        self.executor,
+                        lambda: func(*args, timeout=settings.PAYMENT_GATEWAY_TIMEOUT_SECONDS, **kwargs)
+                    )
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                if attempt == attempts:
+                    raise
+                # A connect timeout never sent the request; anything else may have
+                if lookup is not None and not isinstance(e, requests.ConnectTimeout):
+                    existing = await self._lookup(lookup)
+                    if existing is not None:
+                        return existing
+                # Full jitter keeps retries from many workers from arriving in lockstep
+                delay = random.uniform(0, settings.PAYMENT_GATEWAY_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+                logger.warning(f"Payment gateway call failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except CLIENT_ERRORS:
+                self.breaker.record_success()
+                raise
+            finally:
+                self.breaker.end_call()
+            self.breaker.record_success()
+            return result
+
+    async def _lookup(self, lookup: Callable):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.executor, lambda: lookup(timeout=settings.PAYMENT_GATEWAY_TIMEOUT_SECONDS)
+            )
+        except Exception as e:
+            logger.warning(f"Could not check for a result of the failed gateway call: {e}")
+            return None
+
+    def _find_order(self, receipt: str, timeout: float) -> Optional[dict]:
+        orders = self.client.order.all({"receipt": receipt}, timeout=timeout)
+        items = orders.get("items", [])
+        return items[0] if items else None
+
+    async def create_order(self, order_data: dict) -> dict:
+        """Create an order; a unique receipt makes a retry find the order an earlier attempt created"""
+        order_data = {**order_data}
+        receipt = order_data.setdefault("receipt", f"rcpt_{uuid.uuid4().hex}")
+        return await self._call(
+            self.client.order.create,
+            data=order_data,
+            lookup=lambda timeout: self._find_order(receipt, timeout)
+        )
+
+    def verify_payment_signature(self, razorpay_order_id: str, razorpay_payment_id: str, razorpay_signature: str) -> bool:
+        """Check the checkout signature locally; it is an HMAC-SHA256 of "<order_id>|<payment_id>" """
+        message = f"{razorpay_order_id}|{razorpay_payment_id}".encode()
+        expected = hmac.new(self.key_secret.encode(), message, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, razorpay_signature)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+class GatewayConnection:
+    gateway: PaymentGateway = None
+
+gateway_connection = GatewayConnection()
+
+def get_payment_gateway() -> PaymentGateway:
+    if gateway_connection.gateway is None:
+        raise RuntimeError("Payment gateway is not initialised; connect_payment_gateway() runs at startup")
+    return gateway_connection.gateway
+
+def connect_payment_gateway():
+    """Create the shared gateway client; called from the application lifespan"""
+    gateway_connection.gateway = PaymentGateway(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+    logger.info("Payment gateway client created")
+
+def close_payment_gateway():
+    if gateway_connection.gateway is not None:
+        gateway_connection.gateway.close()
+        gateway_connection.gateway = None
+        logger.info("Payment gateway client closed")
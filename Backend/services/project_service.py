@@ -1,48 +1,508 @@
 import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 from models.project import Project
 from schemas.project import ProjectCreate
+from utils.cache import Cache, InMemoryCacheBackend, VersionStamp
+from utils.config import settings
 from utils.database import db_connection
+from utils.hyperloglog import HyperLogLog
+from utils.pagination import NUMBER, encode_cursor, decode_cursor
+from utils.tracing import traced_service
+from services.ranking_service import RankingService
 
 logger = logging.getLogger(__name__)
 
+# Fields returned by list views; descriptions of volunteer needs, PDFs and all
+# but the cover image are only needed on the detail page.
+PROJECT_LIST_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "images": {"$slice": 1},
+    "imageVariants": {"$slice": 1},
+    "status": 1,
+    "category": 1,
+    "goalAmount": 1,
+    "raisedAmount": 1,
+    "impactScore": 1,
+    "supportersCount": 1,
+    "uniqueDonorsCount": 1,
+    "location": 1,
+    "needsVolunteers": 1,
+    "volunteerFormUrl": 1,
+}
+
+# Approved listings are read far more often than approvals and donations change
+# them. Swap the backend for a shared store when running several workers; the
+# ETag version stamps live on the same backend.
+approved_projects_cache = Cache(
+    "projects:approved",
+    backend=InMemoryCacheBackend(settings.PROJECT_CACHE_MAX_ENTRIES),
+    ttl=settings.PROJECT_CACHE_TTL_SECONDS,
+)
+
+# Change counter for the moderation queue, behind its ETag
+pending_projects_stamp = VersionStamp("projects:pending", backend=approved_projects_cache.backend)
+
+# Approximate distinct-donor sketch, only maintained when DONOR_SKETCH_ENABLED is set
+donor_sketch = HyperLogLog(settings.DONOR_SKETCH_PRECISION)
+
+# Donors are identified by email, falling back to the donor name given at checkout
+# and finally the donation itself, so anonymous donations each count once.
+# DONOR_KEY_EXPRESSION is the aggregation-pipeline twin of donor_key().
+# Both treat a missing, null or empty string the same way.
+DONOR_KEY_EXPRESSION = {"$cond": [
+    {"$gt": [{"$ifNull": ["$email", ""]}, ""]},
+    {"$toLower": "$email"},
+    {"$cond": [{"$gt": [{"$ifNull": ["$donated_by", ""]}, ""]}, "$donated_by", {"$toString": "$_id"}]}
+]}
+
+def donor_key(donation: dict) -> str:
+    if donation.get("email"):
+        return donation["email"].lower()
+    return donation.get("donated_by") or str(donation["_id"])
+
+PROJECT_SORTS = {
+    "newest": [("_id", -1)],
+    "raised": [("raisedAmount", -1), ("_id", -1)],
+}
+
+# Position keys each listing sort keeps in its cursor, besides the id
+PROJECT_CURSOR_FIELDS = {
+    "newest": {},
+    "raised": {"raised": (NUMBER,)},
+}
+
+def _serialize_list_item(project: dict) -> dict:
+    project["_id"] = str(project["_id"])
+    project["id"] = project["_id"]
+    return project
+
+# The moderation queue only needs enough to review a submission
+PENDING_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "owner_email": 1,
+    "images": 1,
+    "pdfDescription": 1,
+    "category": 1,
+    "goalAmount": 1,
+    "location": 1,
+    "needsVolunteers": 1,
+    "volunteerFormUrl": 1,
+    "volunteerDescription": 1,
+    "submitted_at": 1,
+    "version": 1,
+}
+
+def _pending_keyset_filter(position: dict) -> dict:
+    """Filter selecting pending projects after the cursor in (submitted_at, _id) order.
+
+    Projects submitted before submitted_at existed have none and sort first.
+    """
+    last_id = ObjectId(position["id"])
+    if position.get("submitted_at") is None:
+        return {"$or": [
+            {"submitted_at": {"$type": "date"}},
+            {"submitted_at": None, "_id": {"$gt": last_id}},
+        ]}
+    try:
+        submitted_at = datetime.fromisoformat(position["submitted_at"])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return {"$or": [
+        {"submitted_at": {"$gt": submitted_at}},
+        {"submitted_at": submitted_at, "_id": {"$gt": last_id}},
+    ]}
+
+def _keyset_filter(sort: str, position: dict) -> dict:
+    """Build the filter selecting documents strictly after the cursor position"""
+    last_id = ObjectId(position["id"])
+    if sort == "raised":
+        raised = position["raised"]
+        return {"$or": [
+            {"raisedAmount": {"$lt": raised}},
+            {"raisedAmount": raised, "_id": {"$lt": last_id}},
+        ]}
+    return {"_id": {"$lt": last_id}}
+
+@traced_service
 class ProjectService:
     @staticmethod
     async def create_project(project_data: ProjectCreate) -> Project:
         project_dict = project_data.model_dump()
         logger.info(f"Attempting to insert project: {project_dict}")
         result = await db_connection.db.get_collection("projects").insert_one(project_dict)
+        await pending_projects_stamp.bump()
         project = await db_connection.db.get_collection("projects").find_one({"_id": result.inserted_id})
         return Project(**project)
 
     @staticmethod
-    async def get_approved_projects():
-        projects = await db_connection.db.get_collection("projects").find({"status": "approved"}).to_list(100)
-        return [Project(**project) for project in projects]
+    async def get_approved_projects(
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        sort: str = "newest",
+        category: Optional[str] = None,
+        location: Optional[str] = None,
+        needs_volunteers: Optional[bool] = None,
+    ) -> dict:
+        """Get a page of approved projects using keyset pagination"""
+        cache_key = f"{limit}:{cursor}:{sort}:{category}:{location}:{needs_volunteers}"
+        return await approved_projects_cache.get_or_load(
+            cache_key,
+            lambda: ProjectService._load_approved_projects(
+                limit, cursor, sort, category, location, needs_volunteers
+            )
+        )
+
+    @staticmethod
+    async def _load_approved_projects(
+        limit: int,
+        cursor: Optional[str],
+        sort: str,
+        category: Optional[str],
+        location: Optional[str],
+        needs_volunteers: Optional[bool],
+    ) -> dict:
+        query = {"status": "approved"}
+        if category is not None:
+            query["category"] = category
+        if location is not None:
+            query["location"] = location
+        if needs_volunteers is not None:
+            query["needsVolunteers"] = needs_volunteers
+
+        position = decode_cursor(cursor, sort, PROJECT_CURSOR_FIELDS[sort])
+        if position is not None:
+            query.update(_keyset_filter(sort, position))
+
+        # Fetch one extra document to know whether another page exists. This
+        # fills the cache, so it reads the primary: a lagging secondary could
+        # return a page from before the last invalidation, and it would then be
+        # cached under the new generation until the TTL runs out.
+        projects = await db_connection.db.get_collection("projects").find(
+            query, PROJECT_LIST_PROJECTION
+        ).sort(PROJECT_SORTS[sort]).limit(limit + 1).to_list(limit + 1)
+
+        next_cursor = None
+        if len(projects) > limit:
+            projects = projects[:limit]
+            last = projects[-1]
+            next_position = {"sort": sort, "id": str(last["_id"])}
+            if sort == "raised":
+                next_position["raised"] = last.get("raisedAmount", 0)
+            next_cursor = encode_cursor(next_position)
+
+        return {
+            "items": [_serialize_list_item(project) for project in projects],
+            "next_cursor": next_cursor
+        }
 
     @staticmethod
-    async def get_pending_projects():
-        projects = await db_connection.db.get_collection("projects").find({"status": "pending"}).to_list(100)
-        return [Project(**project) for project in projects]
+    async def get_pending_projects(limit: int = 50, cursor: Optional[str] = None) -> dict:
+        """Get a page of the moderation queue, oldest submission first"""
+        query = {"status": "pending"}
+        position = decode_cursor(cursor, "submitted", {"submitted_at": (str, type(None))})
+        if position is not None:
+            query.update(_pending_keyset_filter(position))
+
+        projects = await db_connection.db.get_collection("projects").find(
+            query, PENDING_PROJECTION
+        ).sort([("submitted_at", 1), ("_id", 1)]).limit(limit + 1).to_list(limit + 1)
+
+        next_cursor = None
+        if len(projects) > limit:
+            projects = projects[:limit]
+            last = projects[-1]
+            submitted_at = last.get("submitted_at")
+            next_cursor = encode_cursor({
+                "sort": "submitted",
+                "id": str(last["_id"]),
+                "submitted_at": submitted_at.isoformat() if submitted_at else None,
+            })
+
+        items = []
+        for project in projects:
+            project = _serialize_list_item(project)
+            project.setdefault("version", 0)
+            items.append(project)
+        return {"items": items, "next_cursor": next_cursor}
 
     @staticmethod
-    async def approve_project(project_id: str):
-        from bson import ObjectId
-        await db_connection.db.get_collection("projects").update_one(
-            {"_id": ObjectId(project_id)},
-            {"$set": {"status": "approved"}}
-        )
+    async def moderate_projects(items: List[dict], decision: str, moderator: str, reason: Optional[str] = None) -> List[dict]:
+        """Approve or reject many pending projects in one batched write.
+
+        Each update only matches a project that is still pending and, when the
+        caller passes the version it saw, still at that version, so a project
+        two moderators act on concurrently is decided exactly once. Every
+        update in the batch stamps a fresh batch id, which is how the
+        per-item outcome is read back after the write.
+        Returns one {"id", "result"} entry per item, where result is the new
+        status, "conflict" or "not_found".
+        """
+        # A repeated id would match once but be reported as decided for every copy
+        counts = Counter(item["id"] for item in items)
+        duplicates = sorted(project_id for project_id, count in counts.items() if count > 1)
+        if duplicates:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Projects listed more than once: {', '.join(duplicates)}"
+            )
+        batch_id = str(ObjectId())
+        now = datetime.utcnow()
+        update = {
+            "$set": {
+                "status": decision,
+                "moderated_by": moderator,
+                "moderated_at": now,
+                "moderation_batch": batch_id,
+            },
+            "$inc": {"version": 1},
+        }
+        if decision == "rejected" and reason:
+            update["$set"]["rejectionReason"] = reason
+
+        results = {}
+        operations = []
+        for item in items:
+            project_id = item["id"]
+            if not ObjectId.is_valid(project_id):
+                results[project_id] = {"id": project_id, "result": "not_found"}
+                continue
+            query = {"_id": ObjectId(project_id), "status": "pending"}
+            if item.get("version") is not None:
+                # Projects submitted before versioning have no version field
+                query["version"] = item["version"] if item["version"] else {"$in": [0, None]}
+            operations.append(UpdateOne(query, update))
+
+        collection = db_connection.db.get_collection("projects")
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+
+        object_ids = [ObjectId(item["id"]) for item in items if item["id"] not in results]
+        current = {}
+        async for project in collection.find(
+            {"_id": {"$in": object_ids}},
+            {"status": 1, "version": 1, "moderation_batch": 1}
+        ):
+            current[str(project["_id"])] = project
+
+        decided = []
+        for item in items:
+            project_id = item["id"]
+            if project_id in results:
+                continue
+            project = current.get(project_id)
+            if project is None:
+                results[project_id] = {"id": project_id, "result": "not_found"}
+            elif project.get("moderation_batch") == batch_id:
+                results[project_id] = {"id": project_id, "result": decision, "version": project["version"]}
+                decided.append(project_id)
+            else:
+                results[project_id] = {
+                    "id": project_id,
+                    "result": "conflict",
+                    "status": project.get("status"),
+                    "version": project.get("version", 0),
+                }
+        logger.info(f"{moderator} {decision} {len(decided)} of {len(items)} projects in batch {batch_id}")
+
+        if decided:
+            await pending_projects_stamp.bump()
+        if decided and decision == "approved":
+            await ProjectService.invalidate_approved_projects()
+            # Rank just the newly approved projects instead of rebuilding every list
+            for project_id in decided:
+                await RankingService.refresh_project(project_id)
+        return [results[item["id"]] for item in items]
 
     @staticmethod
     async def update_project_impact_score(project_id: str, impact_score: int):
-        from bson import ObjectId
         await db_connection.db.get_collection("projects").update_one(
             {"_id": ObjectId(project_id)},
             {"$set": {"impactScore": impact_score}}
         )
+        await ProjectService.invalidate_approved_projects()
+        await RankingService.refresh_project(project_id)
+
+    @staticmethod
+    async def invalidate_approved_projects():
+        """Drop cached approved listings; call after any write that changes them"""
+        await approved_projects_cache.invalidate()
+
+    @staticmethod
+    async def get_live_totals(project_ids: List[str]) -> List[dict]:
+        """Current funding totals, sent when a live progress stream opens"""
+        object_ids = [ObjectId(project_id) for project_id in project_ids if ObjectId.is_valid(project_id)]
+        projects = await db_connection.read_db.get_collection("projects").find(
+            {"_id": {"$in": object_ids}},
+            {"raisedAmount": 1, "supportersCount": 1}
+        ).to_list(length=len(object_ids))
+        return [{
+            "project_id": str(project["_id"]),
+            "raisedAmount": project.get("raisedAmount", 0),
+            "supportersCount": project.get("supportersCount", 0),
+        } for project in projects]
+
+    @staticmethod
+    async def approved_projects_version() -> int:
+        return await approved_projects_cache.generation()
+
+    @staticmethod
+    async def pending_projects_version() -> int:
+        return await pending_projects_stamp.get()
+
+    @staticmethod
+    async def record_donor(donation: dict):
+        """Count a newly applied donation's donor towards the project's unique donors"""
+        project_id = donation["project_id"]
+        key = donor_key(donation)
+        counted = await db_connection.db.get_collection("projects").find_one(
+            {"_id": ObjectId(project_id), "uniqueDonorsCount": {"$exists": True}}, {"_id": 1}
+        )
+        if counted is None:
+            await ProjectService._seed_project_donors(project_id)
+        try:
+            await db_connection.db.get_collection("project_donors").insert_one({"project_id": project_id, "donor": key})
+        except DuplicateKeyError:
+            pass  # Returning donor
+        else:
+            await db_connection.db.get_collection("projects").update_one(
+                {"_id": ObjectId(project_id)},
+                {"$inc": {"uniqueDonorsCount": 1}}
+            )
+        if settings.DONOR_SKETCH_ENABLED:
+            # $max makes the sketch update idempotent and safe under concurrency
+            index, rank = donor_sketch.register_update(key)
+            await db_connection.db.get_collection("project_donor_sketches").update_one(
+                {"_id": project_id},
+                {"$max": {f"r.{index}": rank}},
+                upsert=True
+            )
+
+    @staticmethod
+    async def _seed_project_donors(project_id: str):
+        """Start a project's donor counter from its donation history.
+
+        Runs on the first donation to a project counted before this counter
+        existed. Every donor row is inserted once under the unique index and
+        adds exactly one to the counter, so concurrent seeds and donations
+        cannot double count.
+        """
+        db = db_connection.db
+        pairs = await db.get_collection("donations").aggregate([
+            {"$match": {"project_id": project_id, "status": "completed"}},
+            {"$group": {"_id": DONOR_KEY_EXPRESSION}}
+        ]).to_list(length=None)
+        inserted = 0
+        if pairs:
+            result = await db.get_collection("project_donors").bulk_write([
+                UpdateOne(document, {"$setOnInsert": document}, upsert=True)
+                for document in ({"project_id": project_id, "donor": pair["_id"]} for pair in pairs)
+            ], ordered=False)
+            inserted = result.upserted_count
+        # $inc creates the field even when nothing was inserted, so the seed runs once
+        await db.get_collection("projects").update_one(
+            {"_id": ObjectId(project_id)}, {"$inc": {"uniqueDonorsCount": inserted}}
+        )
 
     @staticmethod
-    async def get_donor_count_for_project(project_id: str) -> int:
+    async def get_donor_count_for_project(project_id: str, approximate: bool = False) -> int:
         """Get the number of unique donors for a project"""
-        donations_collection = db_connection.db.get_collection("donations")
-        donor_count = await donations_collection.count_documents({"project_id": project_id})
-        return donor_count
+        donor_counts = await ProjectService.get_donor_counts([project_id], approximate)
+        return donor_counts.get(project_id, 0)
+
+    @staticmethod
+    async def get_donor_counts(project_ids: List[str], approximate: bool = False) -> Dict[str, int]:
+        """Get unique donor counts for many projects in one round trip.
+
+        Counts are read with secondaryPreferred; a few seconds of lag is fine here.
+        """
+        project_ids = list(dict.fromkeys(pid for pid in project_ids if ObjectId.is_valid(pid)))
+        if approximate and settings.DONOR_SKETCH_ENABLED:
+            sketches = db_connection.read_db.get_collection("project_donor_sketches").find({"_id": {"$in": project_ids}})
+            donor_counts = {pid: 0 for pid in project_ids}
+            async for sketch in sketches:
+                registers = {int(index): rank for index, rank in sketch.get("r", {}).items()}
+                donor_counts[sketch["_id"]] = donor_sketch.estimate(registers)
+            return donor_counts
+
+        donor_counts = {}
+        projects = db_connection.read_db.get_collection("projects").find(
+            {"_id": {"$in": [ObjectId(pid) for pid in project_ids]}},
+            {"uniqueDonorsCount": 1}
+        )
+        async for project in projects:
+            if "uniqueDonorsCount" in project:
+                donor_counts[str(project["_id"])] = project["uniqueDonorsCount"]
+
+        # Projects whose counter has not been built yet are counted from donations
+        uncounted = [pid for pid in project_ids if pid not in donor_counts]
+        if uncounted:
+            donor_counts.update({pid: 0 for pid in uncounted})
+            distinct_donors = db_connection.read_db.get_collection("donations").aggregate([
+                {"$match": {"project_id": {"$in": uncounted}, "status": "completed"}},
+                {"$group": {"_id": {"project_id": "$project_id", "donor": DONOR_KEY_EXPRESSION}}},
+                {"$group": {"_id": "$_id.project_id", "count": {"$sum": 1}}}
+            ])
+            async for row in distinct_donors:
+                donor_counts[row["_id"]] = row["count"]
+        return donor_counts
+
+    @staticmethod
+    async def rebuild_donor_counts() -> int:
+        """Rebuild project_donors and uniqueDonorsCount from the donations collection.
+
+        Rows and counts with no completed donation behind them any more are
+        removed or zeroed. Rows created after the rebuild started belong to
+        donations the aggregation may not have seen, so they are left alone.
+        """
+        db = db_connection.db
+        cutoff = ObjectId.from_datetime(datetime.utcnow())
+        pairs = await db.get_collection("donations").aggregate([
+            {"$match": {"status": "completed"}},
+            {"$group": {"_id": {"project_id": "$project_id", "donor": DONOR_KEY_EXPRESSION}}}
+        ]).to_list(length=None)
+
+        donor_counts: Dict[str, int] = {}
+        donors = set()
+        donor_operations = []
+        for pair in pairs:
+            project_id, key = pair["_id"]["project_id"], pair["_id"]["donor"]
+            donor_counts[project_id] = donor_counts.get(project_id, 0) + 1
+            donors.add((project_id, key))
+            document = {"project_id": project_id, "donor": key}
+            donor_operations.append(UpdateOne(document, {"$setOnInsert": document}, upsert=True))
+        if donor_operations:
+            await db.get_collection("project_donors").bulk_write(donor_operations, ordered=False)
+
+        stale_rows = [
+            row["_id"] async for row in db.get_collection("project_donors").find({"_id": {"$lt": cutoff}})
+            if (row.get("project_id"), row.get("donor")) not in donors
+        ]
+        if stale_rows:
+            await db.get_collection("project_donors").delete_many({"_id": {"$in": stale_rows}})
+
+        project_operations = [
+            UpdateOne({"_id": ObjectId(project_id)}, {"$set": {"uniqueDonorsCount": count}})
+            for project_id, count in donor_counts.items() if ObjectId.is_valid(project_id)
+        ]
+        # Projects whose donors are all gone; only zero a count no donation has moved since it was read
+        async for project in db.get_collection("projects").find({"uniqueDonorsCount": {"$gt": 0}}, {"uniqueDonorsCount": 1}):
+            if str(project["_id"]) not in donor_counts:
+                project_operations.append(UpdateOne(
+                    {"_id": project["_id"], "uniqueDonorsCount": project["uniqueDonorsCount"]},
+                    {"$set": {"uniqueDonorsCount": 0}}
+                ))
+        if project_operations:
+            await db.get_collection("projects").bulk_write(project_operations, ordered=False)
+        logger.info(
+            f"Rebuilt unique donor counts for {len(project_operations)} projects, "
+            f"removed {len(stale_rows)} stale donor rows"
+        )
+        return len(project_operations)
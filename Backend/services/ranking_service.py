@@ -0,0 +1,286 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from utils.config import settings
+from utils.database import db_connection
+from utils.tracing import traced_service
+
+logger = logging.getLogger(__name__)
+
+RANKING_METRICS = ("impact", "raised", "supporters", "trending")
+METRIC_FIELDS = {"impact": "impactScore", "raised": "raisedAmount", "supporters": "supportersCount"}
+
+RANKING_PROJECTION = {
+    "title": 1,
+    "images": {"$slice": 1},
+    "category": 1,
+    "location": 1,
+    "goalAmount": 1,
+    "raisedAmount": 1,
+    "supportersCount": 1,
+    "impactScore": 1,
+    "trendingScore": 1,
+    "trendingLandmark": 1,
+    "status": 1,
+}
+
+# Donation timestamps are naive UTC datetimes
+EPOCH = datetime(1970, 1, 1)
+
+# Trending uses forward exponential decay (Cormode et al.): each donation adds
+# amount * exp((t - L) / tau) relative to a landmark L. Every project decays by
+# the same factor over time, so the order only changes when donations arrive,
+# and ranking keys never need recomputing as the clock moves. The landmark is
+# the start of the current UTC day; stored scores are rescaled to it on write,
+# so exponents stay small without any coordination between workers.
+
+def _tau_ms() -> float:
+    return settings.TRENDING_DECAY_HOURS * 3600 * 1000
+
+def _landmark_ms(now_ms: float) -> int:
+    day_ms = 24 * 3600 * 1000
+    return int(now_ms // day_ms * day_ms)
+
+def _trending_key(project: dict) -> float:
+    """Time-invariant ranking key: log of the decayed score plus landmark / tau"""
+    score = project.get("trendingScore") or 0
+    if score <= 0:
+        return float("-inf")
+    return math.log(score) + project.get("trendingLandmark", 0) / _tau_ms()
+
+def _trending_value(key: float, now_ms: float) -> float:
+    """Decayed trending score at now_ms for a ranking key"""
+    return math.exp(key - now_ms / _tau_ms()) if key != float("-inf") else 0.0
+
+def _sort_key(metric: str, project: dict) -> float:
+    if metric == "trending":
+        return _trending_key(project)
+    return project.get(METRIC_FIELDS[metric]) or 0
+
+def _scopes(project: dict) -> List[Tuple[str, Optional[str]]]:
+    scopes = [("overall", None)]
+    for field in ("category", "location"):
+        if project.get(field):
+            scopes.append((field, project[field]))
+    return scopes
+
+class RankingEngine:
+    """Precomputed top-K project lists per metric, overall and per category and location.
+
+    Lists keep a buffer beyond K so that projects dropping out after an
+    incremental update can be backfilled until the next full rebuild.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.capacity = k * 2
+        self._lists: Dict[Tuple[str, str, Optional[str]], List[Tuple[float, str]]] = {}
+        self._projects: Dict[str, dict] = {}
+        self.built_at: Optional[float] = None
+
+    def rebuild(self, projects: List[dict]):
+        lists: Dict[Tuple[str, str, Optional[str]], List[Tuple[float, str]]] = {}
+        members: Dict[str, dict] = {}
+        for project in projects:
+            project_id = str(project["_id"])
+            for metric in RANKING_METRICS:
+                score = _sort_key(metric, project)
+                if score == float("-inf"):
+                    continue
+                for scope, value in _scopes(project):
+                    heap = lists.setdefault((metric, scope, value), [])
+                    entry = (score, project_id)
+                    if len(heap) < self.capacity:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+        for key, heap in lists.items():
+            lists[key] = sorted(heap, reverse=True)
+            for _, project_id in lists[key]:
+                members[project_id] = None
+        by_id = {str(project["_id"]): project for project in projects}
+        self._projects = {project_id: by_id[project_id] for project_id in members}
+        self._lists = lists
+        self.built_at = time.monotonic()
+
+    def update(self, project: dict):
+        """Re-rank one project after its counters changed"""
+        project_id = str(project["_id"])
+        self.remove(project_id)
+        if project.get("status") != "approved":
+            return
+        for metric in RANKING_METRICS:
+            score = _sort_key(metric, project)
+            if score == float("-inf"):
+                continue
+            for scope, value in _scopes(project):
+                ranked = self._lists.setdefault((metric, scope, value), [])
+                if len(ranked) >= self.capacity and (score, project_id) <= ranked[-1]:
+                    continue
+                ranked.append((score, project_id))
+                ranked.sort(reverse=True)
+                del ranked[self.capacity:]
+                self._projects[project_id] = project
+
+    def remove(self, project_id: str):
+        if self._projects.pop(project_id, None) is None:
+            return
+        for ranked in self._lists.values():
+            ranked[:] = [entry for entry in ranked if entry[1] != project_id]
+
+    def top(self, metric: str, category: Optional[str] = None, location: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        if category is not None:
+            key = (metric, "category", category)
+        elif location is not None:
+            key = (metric, "location", location)
+        else:
+            key = (metric, "overall", None)
+        now_ms = time.time() * 1000
+        items = []
+        for score, project_id in self._lists.get(key, [])[:min(limit or self.k, self.k)]:
+            project = self._projects[project_id]
+            items.append({
+                "id": project_id,
+                "title": project.get("title"),
+                "images": project.get("images", []),
+                "category": project.get("category"),
+                "location": project.get("location"),
+                "goalAmount": project.get("goalAmount", 0),
+                "raisedAmount": project.get("raisedAmount", 0),
+                "supportersCount": project.get("supportersCount", 0),
+                "impactScore": project.get("impactScore", 0),
+                "score": _trending_value(score, now_ms) if metric == "trending" else score,
+            })
+        return items
+
+ranking_engine = RankingEngine(settings.RANKING_TOP_K)
+
+@traced_service
+class RankingService:
+    _refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    async def get_leaderboard(metric: str, category: Optional[str] = None, location: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """Top projects for a metric, served from the precomputed lists"""
+        if ranking_engine.built_at is None:
+            await RankingService.refresh()
+        return ranking_engine.top(metric, category, location, limit)
+
+    @staticmethod
+    async def refresh():
+        """Rebuild this worker's top-K lists from the projects collection"""
+        projects = await db_connection.read_db.get_collection("projects").find(
+            {"status": "approved"},
+            RANKING_PROJECTION
+        ).to_list(length=None)
+        ranking_engine.rebuild(projects)
+
+    @staticmethod
+    async def refresh_project(project_id: str):
+        """Re-rank one project after a write that changed its ranking fields"""
+        project = await db_connection.db.get_collection("projects").find_one(
+            {"_id": ObjectId(project_id)},
+            RANKING_PROJECTION
+        )
+        if project is None:
+            ranking_engine.remove(project_id)
+        elif ranking_engine.built_at is not None:
+            ranking_engine.update(project)
+
+    @staticmethod
+    async def record_donation(project_id: str, amount: float, donation_id: str):
+        """Add a donation to the project's trending score, at most once per donation, and re-rank it"""
+        now_ms = time.time() * 1000
+        landmark = _landmark_ms(now_ms)
+        tau = _tau_ms()
+        contribution = amount * math.exp((now_ms - landmark) / tau)
+        # Rescale the stored score to today's landmark and add the new donation in one write
+        await db_connection.db.get_collection("projects").update_one(
+            {"_id": ObjectId(project_id), "trendingDonations": {"$ne": donation_id}},
+            [{"$set": {
+                "trendingScore": {"$add": [
+                    {"$multiply": [
+                        {"$ifNull": ["$trendingScore", 0]},
+                        {"$exp": {"$divide": [{"$subtract": [{"$ifNull": ["$trendingLandmark", landmark]}, landmark]}, tau]}}
+                    ]},
+                    contribution
+                ]},
+                "trendingLandmark": landmark,
+                "trendingDonations": {"$slice": [
+                    {"$concatArrays": [{"$ifNull": ["$trendingDonations", []]}, [donation_id]]},
+                    -settings.DONATION_REDRIVE_WINDOW
+                ]}
+            }}]
+        )
+        await RankingService.refresh_project(project_id)
+
+    @staticmethod
+    async def rebuild_trending_scores() -> int:
+        """Recompute every trending score from recent donations, repairing any drift"""
+        projects = db_connection.db.get_collection("projects")
+        now = datetime.utcnow()
+        landmark = _landmark_ms((now - EPOCH).total_seconds() * 1000)
+        tau = _tau_ms()
+        landmark_date = EPOCH + timedelta(milliseconds=landmark)
+        # Older donations have decayed below exp(-10) of their value and are ignored.
+        # Decay runs on the server's recorded_at, like record_donation does; donated_at
+        # comes from the client and could be backdated or set far in the future.
+        window_start = now - timedelta(milliseconds=10 * tau)
+        scores = await db_connection.db.get_collection("donations").aggregate([
+            {"$match": {"status": "completed", "recorded_at": {"$gte": window_start}}},
+            {"$group": {
+                "_id": "$project_id",
+                "score": {"$sum": {"$multiply": [
+                    "$amount",
+                    {"$exp": {"$divide": [{"$subtract": ["$recorded_at", landmark_date]}, tau]}}
+                ]}}
+            }}
+        ]).to_list(length=None)
+
+        scored_ids = [ObjectId(row["_id"]) for row in scores if ObjectId.is_valid(row["_id"])]
+        operations = [
+            UpdateOne(
+                {"_id": ObjectId(row["_id"])},
+                {"$set": {"trendingScore": row["score"], "trendingLandmark": landmark}}
+            )
+            for row in scores if ObjectId.is_valid(row["_id"])
+        ]
+        if operations:
+            await projects.bulk_write(operations, ordered=False)
+        await projects.update_many(
+            {"_id": {"$nin": scored_ids}, "trendingScore": {"$gt": 0}},
+            {"$set": {"trendingScore": 0, "trendingLandmark": landmark}}
+        )
+        logger.info(f"Rebuilt trending scores for {len(scored_ids)} projects")
+        return len(scored_ids)
+
+    @staticmethod
+    async def _refresh_loop():
+        last_trending_rebuild = time.monotonic()
+        while True:
+            await asyncio.sleep(settings.RANKING_REFRESH_SECONDS)
+            try:
+                if time.monotonic() - last_trending_rebuild >= settings.TRENDING_REBUILD_SECONDS:
+                    await RankingService.rebuild_trending_scores()
+                    last_trending_rebuild = time.monotonic()
+                await RankingService.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing rankings: {e}")
+
+    @staticmethod
+    async def start():
+        await RankingService.refresh()
+        RankingService._refresh_task = asyncio.create_task(RankingService._refresh_loop())
+
+    @staticmethod
+    async def stop():
+        if RankingService._refresh_task is not None:
+            RankingService._refresh_task.cancel()
+            await asyncio.gather(RankingService._refresh_task, return_exceptions=True)
+            RankingService._refresh_task = None
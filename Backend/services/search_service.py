@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from utils.config import settings
+from utils.database import db_connection
+from utils.indexes import PROJECT_TEXT_WEIGHTS
+from utils.inverted_index import InvertedIndex
+from utils.pagination import NUMBER, encode_cursor, decode_cursor
+from utils.tracing import traced_service
+from services.project_service import PROJECT_LIST_PROJECTION, _serialize_list_item
+
+logger = logging.getLogger(__name__)
+
+FACET_FIELDS = ("category", "location", "needsVolunteers")
+FACET_LIMIT = 20
+
+# PROJECT_LIST_PROJECTION in aggregation syntax, plus the relevance score
+SEARCH_PROJECTION = {field: 1 for field, value in PROJECT_LIST_PROJECTION.items() if value == 1}
+SEARCH_PROJECTION.update({
+    "images": {"$slice": [{"$ifNull": ["$images", []]}, 1]},
+    "imageVariants": {"$slice": [{"$ifNull": ["$imageVariants", []]}, 1]},
+    "score": 1,
+})
+
+def _filters(category: Optional[str], location: Optional[str], needs_volunteers: Optional[bool]) -> dict:
+    query = {}
+    if category is not None:
+        query["category"] = category
+    if location is not None:
+        query["location"] = location
+    if needs_volunteers is not None:
+        query["needsVolunteers"] = needs_volunteers
+    return query
+
+def _next_cursor(items: List[dict], limit: int) -> Optional[str]:
+    if len(items) <= limit:
+        return None
+    last = items[limit - 1]
+    return encode_cursor({"sort": "relevance", "id": str(last["_id"]), "score": last["score"]})
+
+class SearchIndexHolder:
+    """Fallback inverted index over approved projects, rebuilt when stale"""
+    index = InvertedIndex(PROJECT_TEXT_WEIGHTS)
+    built_at: Optional[float] = None
+    lock = asyncio.Lock()
+
+search_index = SearchIndexHolder()
+
+@traced_service
+class SearchService:
+    @staticmethod
+    async def search(
+        q: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        category: Optional[str] = None,
+        location: Optional[str] = None,
+        needs_volunteers: Optional[bool] = None,
+    ) -> dict:
+        """Search approved projects by relevance.
+
+        Facet counts and the total are computed on the first page only, since
+        they do not change while paging.
+        """
+        position = decode_cursor(cursor, "relevance", {"score": (NUMBER,)})
+        filters = _filters(category, location, needs_volunteers)
+        if settings.SEARCH_BACKEND == "text":
+            try:
+                return await SearchService._text_search(q, limit, position, filters)
+            except OperationFailure as e:
+                # No text index (or no $text support on this deployment)
+                logger.warning(f"Text search unavailable, using in-memory index: {e}")
+        return await SearchService._memory_search(q, limit, position, filters)
+
+    @staticmethod
+    async def _text_search(q: str, limit: int, position: Optional[dict], filters: dict) -> dict:
+        items_pipeline = []
+        if position is not None:
+            items_pipeline.append({"$match": {"$or": [
+                {"score": {"$lt": position["score"]}},
+                {"score": position["score"], "_id": {"$lt": ObjectId(position["id"])}},
+            ]}})
+        items_pipeline += [
+            {"$sort": {"score": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": SEARCH_PROJECTION},
+        ]
+        facets = {"items": items_pipeline}
+        if position is None:
+            for field in FACET_FIELDS:
+                facets[field] = [{"$sortByCount": f"${field}"}, {"$limit": FACET_LIMIT}]
+            facets["total"] = [{"$count": "count"}]
+
+        # One round trip: the text match runs once and feeds both the page and the facets
+        result = await db_connection.read_db.get_collection("projects").aggregate([
+            {"$match": {"$text": {"$search": q}, "status": "approved", **filters}},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$facet": facets},
+        ]).to_list(length=1)
+        result = result[0]
+
+        items = result["items"]
+        response = {
+            "items": [_serialize_list_item(item) for item in items[:limit]],
+            "next_cursor": _next_cursor(items, limit),
+            "facets": None,
+            "total": None,
+        }
+        if position is None:
+            response["facets"] = {
+                field: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in result[field]]
+                for field in FACET_FIELDS
+            }
+            response["total"] = result["total"][0]["count"] if result["total"] else 0
+        return response
+
+    @staticmethod
+    async def _ensure_memory_index() -> InvertedIndex:
+        if search_index.built_at is not None and time.monotonic() - search_index.built_at < settings.SEARCH_INDEX_REFRESH_SECONDS:
+            return search_index.index
+        async with search_index.lock:
+            # Another request may have rebuilt the index while this one waited
+            if search_index.built_at is None or time.monotonic() - search_index.built_at >= settings.SEARCH_INDEX_REFRESH_SECONDS:
+                projects = await db_connection.read_db.get_collection("projects").find(
+                    {"status": "approved"}, PROJECT_LIST_PROJECTION
+                ).to_list(length=None)
+                search_index.index.build(
+                    (str(project["_id"]), _serialize_list_item(project)) for project in projects
+                )
+                search_index.built_at = time.monotonic()
+                logger.info(f"Rebuilt in-memory search index over {len(projects)} projects")
+        return search_index.index
+
+    @staticmethod
+    async def _memory_search(q: str, limit: int, position: Optional[dict], filters: dict) -> dict:
+        index = await SearchService._ensure_memory_index()
+        matches = []
+        for doc_id, score in index.search(q).items():
+            document = index.documents[doc_id]
+            if all(document.get(field) == value for field, value in filters.items()):
+                matches.append((score, doc_id))
+        matches.sort(reverse=True)
+
+        response = {"facets": None, "total": None}
+        if position is None:
+            facets: Dict[str, Counter] = {field: Counter() for field in FACET_FIELDS}
+            for _, doc_id in matches:
+                for field in FACET_FIELDS:
+                    facets[field][index.documents[doc_id].get(field)] += 1
+            response["facets"] = {
+                field: [{"value": value, "count": count} for value, count in counts.most_common(FACET_LIMIT)]
+                for field, counts in facets.items()
+            }
+            response["total"] = len(matches)
+        else:
+            after = (position["score"], position["id"])
+            matches = [match for match in matches if match < after]
+
+        items = [{**index.documents[doc_id], "score": score} for score, doc_id in matches[:limit + 1]]
+        response["items"] = items[:limit]
+        response["next_cursor"] = _next_cursor(items, limit)
+        return response
@@ -1,14 +1,25 @@
 from typing import Optional
-from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from models.user import User, UserResponse
+from services.project_service import approved_projects_cache
+from utils.cache import VersionStamp
+from utils.config import settings
 from utils.database import get_database
-from utils.auth import get_password_hash
+from utils.auth import get_password_hash, invalidate_principal
+from utils.tracing import traced_service
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Per-donor change counter behind the /auth/me/stats ETag. It shares the listings
+# cache backend, so every worker sees the same stamps once that is a shared store.
+user_stats_stamp = VersionStamp("user_stats", backend=approved_projects_cache.backend)
+
+@traced_service
 class UserService:
     @staticmethod
     async def create_user(user_data: dict) -> Optional[UserResponse]:
@@ -18,7 +29,7 @@ class UserService:
             
             # Hash password if provided
             if user_data.get("password"):
-                user_data["password_hash"] = get_password_hash(user_data.pop("password"))
+                user_data["password_hash"] = await get_password_hash(user_data.pop("password"))
             
             user_data["created_at"] = datetime.utcnow()
             user_data["updated_at"] = datetime.utcnow()
@@ -40,6 +51,8 @@ class UserService:
         except DuplicateKeyError:
             logger.warning(f"User with email {user_data.get('email')} already exists")
             return None
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error creating user: {e}")
             return None
@@ -71,30 +84,153 @@ class UserService:
             return None
     
     @staticmethod
-    async def get_user_stats(email: str) -> dict:
-        """Get user donation stats"""
+    async def upsert_google_user(google_id: str, email: str, name: str, picture: Optional[str]) -> dict:
+        """Find the user by Google ID or email, linking or creating the account, in one write.
+
+        Two first logins racing on the same email both try to insert; the
+        loser hits the unique email index and retries, matching the winner.
+        """
+        db = await get_database()
+        now = datetime.utcnow()
+        for attempt in range(2):
+            try:
+                user = await db.users.find_one_and_update(
+                    {"$or": [{"google_id": google_id}, {"email": email}]},
+                    {
+                        "$set": {"google_id": google_id, "profile_picture": picture, "updated_at": now},
+                        "$setOnInsert": {
+                            "name": name,
+                            "email": email,
+                            "created_at": now,
+                            "is_active": True,
+                            "role": "user",
+                        },
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                break
+            except DuplicateKeyError:
+                if attempt:
+                    raise
+        invalidate_principal(user["email"])
+        user["id"] = str(user["_id"])
+        return user
+
+    @staticmethod
+    async def update_user(email: str, update_data: dict) -> bool:
+        """Update fields on the user with the given email"""
         try:
             db = await get_database()
-            donations = await db.donations.find({"email": email}).to_list(length=None)
-
-            total_donated = sum(d['amount'] for d in donations)
-            projects_supported = len(set(d['project_id'] for d in donations))
+            update_data["updated_at"] = datetime.utcnow()
+            result = await db.users.update_one({"email": email}, {"$set": update_data})
+            invalidate_principal(email)
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Error updating user: {e}")
+            return False
 
+    @staticmethod
+    async def revoke_tokens(email: str) -> bool:
+        """Invalidate every token issued to the user by bumping their token version"""
+        try:
+            db = await get_database()
+            result = await db.users.update_one(
+                {"email": email},
+                {"$inc": {"token_version": 1}, "$set": {"updated_at": datetime.utcnow()}}
+            )
+            invalidate_principal(email)
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Error revoking user tokens: {e}")
+            return False
+    
+    @staticmethod
+    async def get_user_stats(email: str) -> dict:
+        """Get user donation stats from the per-user rollup"""
+        try:
+            db = await get_database()
+            rollup = await db.user_stats.find_one({"_id": email})
+            if rollup is None:
+                # No rollup yet (donations predating rollups); build it once from history
+                rollup = await UserService.rebuild_user_stats(email)
+            # Impact is the supported projects' live impactScore, so it is read, not rolled up
+            project_ids = [ObjectId(pid) for pid in rollup.get("projectsSupported", []) if ObjectId.is_valid(pid)]
             impact_points = 0
-            project_ids = [d['project_id'] for d in donations]
             if project_ids:
-                projects = await db.projects.find({"_id": {"$in": [ObjectId(pid) for pid in project_ids]}}).to_list(length=None)
-                impact_points = sum(p.get('impactScore', 0) for p in projects)
-
-            return {
-                "totalDonated": total_donated,
-                "projectsSupported": projects_supported,
-                "impactPoints": impact_points
-            }
+                projects = await db.projects.find({"_id": {"$in": project_ids}}, {"impactScore": 1}).to_list(length=None)
+                impact_points = sum(p.get("impactScore", 0) for p in projects)
+            return _stats_response(rollup, impact_points)
         except Exception as e:
             logger.error(f"Error getting user stats: {e}")
-            return {
-                "totalDonated": 0,
-                "projectsSupported": 0,
-                "impactPoints": 0
-            }
\ No newline at end of file
+            return _stats_response(None)
+
+    @staticmethod
+    async def record_donation(email: str, project_id: str, amount: float, donation_id: str):
+        """Fold one applied donation into the donor's rollup, at most once per donation.
+
+        A donor without a rollup yet is seeded from their donation history first;
+        the donation being recorded is still "applying", so it is not in the seed.
+        """
+        db = await get_database()
+        if await db.user_stats.find_one({"_id": email}, {"_id": 1}) is None:
+            await UserService.rebuild_user_stats(email)
+        try:
+            await db.user_stats.update_one(
+                # The rollup remembers recent donation ids, so replaying one matches nothing
+                {"_id": email, "appliedDonations": {"$ne": donation_id}},
+                {
+                    "$inc": {"totalDonated": amount},
+                    "$addToSet": {"projectsSupported": project_id},
+                    "$push": {"appliedDonations": {"$each": [donation_id], "$slice": -settings.DONATION_REDRIVE_WINDOW}},
+                    "$set": {"updated_at": datetime.utcnow()}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return  # Already applied; the upsert collided with the existing rollup
+        await user_stats_stamp.bump(email)
+
+    @staticmethod
+    async def rebuild_user_stats(email: Optional[str] = None) -> Optional[dict]:
+        """Recompute rollups from the donations collection, for one donor or all of them.
+
+        Returns the rebuilt rollup when email is given.
+        """
+        db = await get_database()
+        match = {"status": "completed", "counter_state": {"$in": ["applied", None]}}
+        if email is not None:
+            match["email"] = email
+        else:
+            match["email"] = {"$type": "string"}
+        rollups = await db.donations.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": "$email",
+                "totalDonated": {"$sum": "$amount"},
+                "projectsSupported": {"$addToSet": "$project_id"}
+            }}
+        ]).to_list(length=None)
+
+        now = datetime.utcnow()
+        if email is not None:
+            rollup = rollups[0] if rollups else {"_id": email, "totalDonated": 0, "projectsSupported": []}
+            rollup["updated_at"] = now
+            # Never clobber a rollup a concurrent donation created meanwhile
+            await db.user_stats.update_one({"_id": email}, {"$setOnInsert": rollup}, upsert=True)
+            return await db.user_stats.find_one({"_id": email})
+
+        operations = [ReplaceOne({"_id": rollup["_id"]}, {**rollup, "updated_at": now}, upsert=True) for rollup in rollups]
+        if operations:
+            await db.user_stats.bulk_write(operations, ordered=False)
+        logger.info(f"Rebuilt donation stats for {len(operations)} users")
+        return None
+
+def _stats_response(rollup: Optional[dict], impact_points: int = 0) -> dict:
+    if rollup is None:
+        return {"totalDonated": 0, "projectsSupported": 0, "impactPoints": 0}
+    return {
+        "totalDonated": rollup.get("totalDonated", 0),
+        "projectsSupported": len(rollup.get("projectsSupported", [])),
+        "impactPoints": impact_points
+    }
@@ -0,0 +1,95 @@
+"""Local stand-in for Google's OAuth endpoints, for development and tests.
+
+    python tools/fake_google_oauth.py --port 9000
+
+then start the backend with
+
+    GOOGLE_AUTH_URL=http://localhost:9000/o/oauth2/auth
+    GOOGLE_TOKEN_URL=http://localhost:9000/token
+    GOOGLE_CERTS_URL=http://localhost:9000/oauth2/v3/certs
+
+The consent page is skipped: /o/oauth2/auth redirects straight back with a
+code for the address in login_hint (default dev@example.com). ID tokens are
+signed with a key generated at startup and published, with a Cache-Control
+max-age like Google's, on the certs endpoint.
+"""
+import argparse
+import hashlib
+import os
+import secrets
+import sys
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, Form, HTTPException
+from fastapi.responses import JSONResponse, RedirectResponse
+from jose import jwk, jwt
+from utils.config import settings
+
+KEY_ID = "fake-google-1"
+ISSUER = "https://accounts.google.com"
+
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PRIVATE_PEM = _private_key.private_bytes(
+    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+)
+PUBLIC_JWK = {
+    **jwk.construct(
+        _private_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo),
+        "RS256"
+    ).to_dict(),
+    "kid": KEY_ID,
+    "use": "sig",
+}
+
+# Issued codes, each good for one exchange
+_codes = {}
+
+app = FastAPI(title="Fake Google OAuth")
+
+@app.get("/o/oauth2/auth")
+async def authorize(redirect_uri: str, client_id: str, state: str = None, login_hint: str = "dev@example.com"):
+    code = secrets.token_urlsafe(16)
+    _codes[code] = {"email": login_hint.lower(), "client_id": client_id}
+    params = {"code": code}
+    if state:
+        params["state"] = state
+    return RedirectResponse(f"{redirect_uri}?{urlencode(params)}")
+
+@app.post("/token")
+async def token(code: str = Form(...), client_id: str = Form(...), grant_type: str = Form(...)):
+    grant = _codes.pop(code, None)
+    if grant is None or grant["client_id"] != client_id or grant_type != "authorization_code":
+        raise HTTPException(status_code=400, detail="invalid_grant")
+    access_token = secrets.token_urlsafe(32)
+    now = int(time.time())
+    email = grant["email"]
+    id_token = jwt.encode({
+        "iss": ISSUER,
+        "aud": client_id,
+        "sub": str(int(hashlib.sha256(email.encode()).hexdigest(), 16) % 10**21),
+        "email": email,
+        "email_verified": True,
+        "name": email.split("@")[0].title(),
+        "picture": None,
+        "iat": now,
+        "exp": now + 3600,
+    }, PRIVATE_PEM.decode(), algorithm="RS256", headers={"kid": KEY_ID}, access_token=access_token)
+    return {"access_token": access_token, "id_token": id_token, "expires_in": 3599, "token_type": "Bearer"}
+
+@app.get("/oauth2/v3/certs")
+async def certs():
+    return JSONResponse({"keys": [PUBLIC_JWK]}, headers={"Cache-Control": "public, max-age=21600"})
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Run a fake Google OAuth server")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    if not settings.GOOGLE_CLIENT_ID:
+        print("GOOGLE_CLIENT_ID is not set; tokens are issued for whatever client_id is sent")
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
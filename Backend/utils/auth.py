@@ -1,25 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from .cache import TTLCache
 from .config import settings
 from .database import get_database
+from .metrics import PASSWORD_HASH_DURATION
+from .tracing import span
 import logging
 
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes below the configured cost factor are reported as needing an update,
+# which triggers a rehash on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+# bcrypt releases the GIL while hashing, so a small thread pool keeps the event
+# loop free without the pickling overhead of a process pool.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+_pending_hashes = 0
+
+# Per-worker principal caches keyed by token subject. Entries live briefly, so
+# a bumped token_version revokes outstanding tokens within one TTL.
+_principal_cache = TTLCache(settings.PRINCIPAL_CACHE_MAX_ENTRIES)
+_token_version_cache = TTLCache(settings.PRINCIPAL_CACHE_MAX_ENTRIES)
+
+def _timed_hash(func: Callable, *args):
+    with PASSWORD_HASH_DURATION.time(func.__name__):
+        return func(*args)
+
+async def _run_hash_job(func: Callable, *args):
+    """Run a hashing call on the pool, rejecting work once the queue is full"""
+    global _pending_hashes
+    if _pending_hashes >= settings.PASSWORD_HASH_MAX_PENDING:
+        logger.warning("Password hashing queue is full, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _pending_hashes += 1
+    try:
+        loop = asyncio.get_running_loop()
+        with span(f"password.{func.__name__}"):
+            return await loop.run_in_executor(_hash_executor, _timed_hash, func, *args)
+    finally:
+        _pending_hashes -= 1
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    verified, _ = await verify_and_update_password(plain_password, hashed_password)
+    return verified
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a replacement hash if the stored one uses deprecated settings"""
+    if not hashed_password:
+        return False, None
+    return await _run_hash_job(pwd_context.verify_and_update, plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return await _run_hash_job(pwd_context.hash, password)
+
+def build_token_claims(user: dict) -> dict:
+    """Claims identifying a user; signed into the token so most requests skip the user lookup"""
+    return {
+        "sub": user["email"],
+        "uid": str(user["_id"]),
+        "role": user.get("role", "user"),
+        "active": user.get("is_active", True),
+        "ver": user.get("token_version", 0),
+    }
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -53,27 +117,80 @@ async def verify_token(token: str):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def _load_user(email: str) -> Optional[dict]:
+    """Get a user document through the principal cache"""
+    user = _principal_cache.get(email)
+    if user is None:
+        db = await get_database()
+        user = await db.users.find_one({"email": email}, {"password_hash": 0})
+        if user is None:
+            return None
+        # Convert ObjectId to string for JSON serialization
+        user["_id"] = str(user["_id"])
+        user["id"] = user["_id"]
+        _principal_cache.set(email, user, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+        _token_version_cache.set(email, user.get("token_version", 0), settings.PRINCIPAL_CACHE_TTL_SECONDS)
+    return user
+
+async def _current_token_version(email: str) -> Optional[int]:
+    """Get the user's token version, hitting the database only when the cached value expired"""
+    version = _token_version_cache.get(email)
+    if version is None:
+        db = await get_database()
+        user = await db.users.find_one({"email": email}, {"token_version": 1})
+        if user is None:
+            return None
+        version = user.get("token_version", 0)
+        _token_version_cache.set(email, version, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+    return version
+
+def invalidate_principal(email: str):
+    """Drop this worker's cached principal so the next request reloads it"""
+    _principal_cache.pop(email)
+    _token_version_cache.pop(email)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user from JWT token"""
     token = credentials.credentials
     payload = await verify_token(token)
-    
-    db = await get_database()
-    user = await db.users.find_one({"email": payload.get("sub")})
-    
+    email = payload.get("sub")
+
+    user = await _load_user(email)
     if user is None:
-        logger.warning(f"User with email {payload.get("sub")} not found in database.")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Convert ObjectId to string for JSON serialization
-    user["_id"] = str(user["_id"])
-    return user
+        logger.warning(f"User with email {email} not found in database.")
+        raise _credentials_exception()
+    if payload.get("ver", 0) != user.get("token_version", 0):
+        raise _credentials_exception()
+    return dict(user)
+
+async def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Get the caller's identity from signed token claims, without loading the full user"""
+    token = credentials.credentials
+    payload = await verify_token(token)
+    if not settings.TRUST_TOKEN_CLAIMS or "uid" not in payload:
+        # Tokens issued before claims were embedded need the full lookup
+        return await get_current_user(credentials)
+
+    email = payload.get("sub")
+    version = await _current_token_version(email)
+    if version is None or payload.get("ver", 0) != version:
+        raise _credentials_exception()
+    return {
+        "_id": payload["uid"],
+        "id": payload["uid"],
+        "email": email,
+        "role": payload.get("role", "user"),
+        "is_active": payload.get("active", True),
+    }
 
-async def get_current_admin_user(current_user: dict = Depends(get_current_user)):
+async def get_current_admin_user(current_user: dict = Depends(get_current_principal)):
     """Get current user and check if they are an admin"""
     if current_user.get("role") != "admin":
         raise HTTPException(
@@ -0,0 +1,190 @@
+"""Fan-out of live project updates to server-sent event streams.
+
+Each client gets a bounded queue. Publishing never waits: when a slow
+client's queue is full its oldest event is dropped. Events carry the new
+totals alongside the delta, so a client that missed one still converges on
+the next.
+
+With SSE_SOURCE="local" events are published by the worker that applied
+the donation and only reach that worker's clients. SSE_SOURCE="change_stream"
+tails the projects collection instead (replica sets only), so every worker
+sees every update.
+"""
+import asyncio
+import logging
+import random
+from typing import Dict, Iterable, Optional, Set
+from pymongo.errors import OperationFailure, PyMongoError
+from .config import settings
+from .database import db_connection
+from .metrics import CallbackMetric, registry
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Fields whose changes are pushed to clients
+LIVE_FIELDS = ("raisedAmount", "supportersCount")
+
+# Queued instead of an event to end a stream
+_CLOSE = object()
+
+class Subscription:
+    def __init__(self, project_ids: Optional[Set[str]], buffer_size: int):
+        self.project_ids = project_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.active = True
+
+    def offer(self, item) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait(item)
+            self.dropped += 1
+
+class Broadcaster:
+    def __init__(self, buffer_size: int, max_clients: int):
+        self.buffer_size = buffer_size
+        self.max_clients = max_clients
+        self.closed = False
+        self._sequence = 0
+        self._clients = 0
+        # Subscriptions by project id; None holds clients following every project
+        self._topics: Dict[Optional[str], Set[Subscription]] = {}
+
+    @property
+    def clients(self) -> int:
+        return self._clients
+
+    def subscribe(self, project_ids: Optional[Iterable[str]] = None) -> Optional[Subscription]:
+        """Register a client; returns None when the server is at capacity or shutting down"""
+        if self.closed or self._clients >= self.max_clients:
+            return None
+        subscription = Subscription(set(project_ids) if project_ids else None, self.buffer_size)
+        for topic in subscription.project_ids or [None]:
+            self._topics.setdefault(topic, set()).add(subscription)
+        self._clients += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a client; safe to call more than once for the same subscription"""
+        if not subscription.active:
+            return
+        subscription.active = False
+        for topic in subscription.project_ids or [None]:
+            subscribers = self._topics.get(topic)
+            if subscribers is None or subscription not in subscribers:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[topic]
+        self._clients -= 1
+
+    def publish(self, project_id: str, totals: dict, delta: Optional[dict] = None) -> None:
+        self._sequence += 1
+        event = {
+            "id": self._sequence,
+            "data": {"project_id": project_id, **{field: totals.get(field) for field in LIVE_FIELDS}},
+        }
+        if delta:
+            event["data"]["delta"] = delta
+        for subscription in self._topics.get(project_id, ()):
+            subscription.offer(event)
+        for subscription in self._topics.get(None, ()):
+            subscription.offer(event)
+
+    def close(self) -> None:
+        """End every stream, e.g. at shutdown so clients reconnect to another worker"""
+        self.closed = True
+        for subscribers in self._topics.values():
+            for subscription in subscribers:
+                subscription.offer(_CLOSE)
+
+broadcaster = Broadcaster(settings.SSE_CLIENT_BUFFER, settings.SSE_MAX_CLIENTS)
+
+registry.register(CallbackMetric(
+    "sse_clients", "Connected server-sent event clients", (),
+    lambda: [((), broadcaster.clients)]
+))
+
+def format_event(event: dict, name: str = "progress") -> str:
+    return f"id: {event['id']}\nevent: {name}\ndata: {dumps(event['data']).decode()}\n\n"
+
+async def stream_events(subscription: Subscription, snapshot: Iterable[dict] = ()):
+    """Yield SSE frames for a subscription until the broadcaster closes or the client leaves.
+
+    The generator never runs if the client leaves before the first frame, so
+    callers also unsubscribe from the response's background task.
+    """
+    try:
+        # Jittered reconnect delay so a restart does not bring every client back at once
+        yield f"retry: {settings.SSE_RETRY_MS + random.randint(0, settings.SSE_RETRY_MS)}\n\n"
+        for totals in snapshot:
+            yield format_event({"id": 0, "data": totals}, "snapshot")
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line; keeps proxies from closing an idle connection
+                yield ": heartbeat\n\n"
+                continue
+            if event is _CLOSE:
+                return
+            yield format_event(event)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+class ChangeStreamTailer:
+    """Publishes LIVE_FIELDS changes seen on the projects change stream.
+
+    Updates made with $inc report the new values in updatedFields, so no
+    document lookup is needed. The stream resumes after its last event when
+    it reconnects, backing off exponentially while the server is unavailable.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._tail(), name="sse-change-stream")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _tail(self):
+        pipeline = [{"$match": {
+            "operationType": "update",
+            "$or": [{f"updateDescription.updatedFields.{field}": {"$exists": True}} for field in LIVE_FIELDS],
+        }}]
+        backoff = 1.0
+        while True:
+            try:
+                async with db_connection.db.get_collection("projects").watch(
+                    pipeline, resume_after=self._resume_token
+                ) as stream:
+                    backoff = 1.0
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        broadcaster.publish(
+                            str(change["documentKey"]["_id"]),
+                            change["updateDescription"]["updatedFields"]
+                        )
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # Typically the resume point has rolled off the oplog; start from now
+                logger.warning(f"Project change stream failed, restarting without resuming: {e}")
+                self._resume_token = None
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+            except PyMongoError as e:
+                logger.warning(f"Project change stream interrupted, retrying in {backoff:.0f}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+change_stream_tailer = ChangeStreamTailer()
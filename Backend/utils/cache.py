@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+from .metrics import CallbackMetric, registry
+
+class CacheBackend:
+    """Storage interface used by Cache; implement it to share entries between workers"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        """Atomically increment a counter that is never evicted and return the new value"""
+        raise NotImplementedError
+
+    async def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+class TTLCache:
+    """Size-bounded LRU mapping whose entries expire after a per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class InMemoryCacheBackend(CacheBackend):
+    """Per-process backend; the default for single-worker deployments and tests"""
+
+    def __init__(self, max_entries: int = 1024):
+        self._entries = TTLCache(max_entries)
+        self._counters: dict = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries.set(key, value, ttl)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+# Every Cache instance, so their hit rates can be exported
+caches: List["Cache"] = []
+
+class Cache:
+    """Namespaced read-through cache.
+
+    Keys are prefixed with a generation number kept in the backend, so
+    invalidate() drops every entry in the namespace with a single increment,
+    for all workers sharing the backend.
+    """
+
+    def __init__(self, namespace: str, backend: CacheBackend, ttl: float):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._generation_key = f"{namespace}:generation"
+        caches.append(self)
+
+    async def _key(self, key: str) -> str:
+        generation = await self.backend.get_counter(self._generation_key)
+        return f"{self.namespace}:{generation}:{key}"
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, calling loader and storing its result on a miss"""
+        # Resolve the generation before loading so a write that invalidates
+        # mid-load leaves the stale result under the old generation.
+        versioned_key = await self._key(key)
+        value = await self.backend.get(versioned_key)
+        if value is not None:
+            self.stats.hits += 1
+            return value
+        self.stats.misses += 1
+        value = await loader()
+        await self.backend.set(versioned_key, value, self.ttl)
+        return value
+
+    async def invalidate(self) -> None:
+        await self.backend.incr(self._generation_key)
+
+    async def generation(self) -> int:
+        """Bumped by every invalidate(), so it doubles as a version stamp for ETags"""
+        return await self.backend.get_counter(self._generation_key)
+
+class VersionStamp:
+    """Change counter for a resource that is not cached, bumped by the writes that change it"""
+
+    def __init__(self, namespace: str, backend: CacheBackend):
+        self.namespace = namespace
+        self.backend = backend
+
+    async def get(self, key: str = "") -> int:
+        return await self.backend.get_counter(f"{self.namespace}:{key}")
+
+    async def bump(self, key: str = "") -> None:
+        await self.backend.incr(f"{self.namespace}:{key}")
+
+registry.register(CallbackMetric(
+    "cache_hits_total", "Read-through cache hits", ("cache",),
+    lambda: [((cache.namespace,), cache.stats.hits) for cache in caches],
+    kind="counter"
+))
+registry.register(CallbackMetric(
+    "cache_misses_total", "Read-through cache misses", ("cache",),
+    lambda: [((cache.namespace,), cache.stats.misses) for cache in caches],
+    kind="counter"
+))
@@ -0,0 +1,47 @@
+"""Conditional GET for API responses built from version stamps.
+
+An ETag is a hash of the request URL, the version stamps of the data behind
+it and the current ETAG_WINDOW_SECONDS window, so it is known before any
+query runs and If-None-Match can be answered with a 304 straight away.
+
+Stamps are bumped by the writes that change the data. With the in-memory
+cache backend each worker keeps its own stamps and does not see writes made
+by other workers; the time window bounds how long such a change can go
+unnoticed, the same staleness the listing cache already accepts.
+"""
+import hashlib
+import time
+from fastapi import HTTPException, Request, status
+from .config import settings
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    # If-None-Match uses weak comparison
+    return etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in candidates)
+
+def make_etag(request: Request, *versions) -> str:
+    window = int(time.time() // settings.ETAG_WINDOW_SECONDS)
+    parts = [str(request.url.path), str(request.url.query), str(window), *map(str, versions)]
+    digest = hashlib.blake2b("\0".join(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def check_not_modified(request: Request, *versions, private: bool = False) -> dict:
+    """Raise 304 when the client already has this version; otherwise return the validator headers.
+
+    Per-user responses must pass private=True and include the caller's
+    identity in versions, so a browser shared between accounts never
+    revalidates one account's copy with another's token.
+    """
+    headers = {
+        "ETag": make_etag(request, *versions),
+        # Clients may keep the body but must revalidate before reusing it
+        "Cache-Control": "private, no-cache" if private else "no-cache",
+    }
+    if private:
+        headers["Vary"] = "Authorization"
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return headers
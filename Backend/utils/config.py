@@ -3,19 +3,129 @@ from decouple import config
 class Settings:
     MONGODB_URL: str = config("MONGODB_URL", default="mongodb://localhost:27017")
     DATABASE_NAME: str = config("DATABASE_NAME", default="myapp")
+    MONGODB_MAX_POOL_SIZE: int = config("MONGODB_MAX_POOL_SIZE", default=100, cast=int)
+    MONGODB_MIN_POOL_SIZE: int = config("MONGODB_MIN_POOL_SIZE", default=0, cast=int)
+    MONGODB_MAX_IDLE_TIME_MS: int = config("MONGODB_MAX_IDLE_TIME_MS", default=0, cast=int)  # 0 keeps idle connections
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = config("MONGODB_WAIT_QUEUE_TIMEOUT_MS", default=5000, cast=int)
+    MONGODB_CONNECT_TIMEOUT_MS: int = config("MONGODB_CONNECT_TIMEOUT_MS", default=10000, cast=int)
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = config("MONGODB_SERVER_SELECTION_TIMEOUT_MS", default=10000, cast=int)
+    MONGODB_SOCKET_TIMEOUT_MS: int = config("MONGODB_SOCKET_TIMEOUT_MS", default=0, cast=int)  # 0 means no timeout
+    MONGODB_COMPRESSORS: str = config("MONGODB_COMPRESSORS", default="zlib")  # e.g. "zstd,snappy,zlib"; zstd and snappy need extra packages
+    MONGODB_SECONDARY_READS: bool = config("MONGODB_SECONDARY_READS", default=True, cast=bool)
+    MONGODB_MAX_STALENESS_SECONDS: int = config("MONGODB_MAX_STALENESS_SECONDS", default=-1, cast=int)  # -1 for no limit, else at least 90
+    MONGODB_REQUIRE_INDEXES: bool = config("MONGODB_REQUIRE_INDEXES", default=False, cast=bool)  # Refuse to start if an index cannot be built
     
     SECRET_KEY: str = config("SECRET_KEY", default="your-super-secret-key-here")
     ALGORITHM: str = config("ALGORITHM", default="HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = config("ACCESS_TOKEN_EXPIRE_MINUTES", default=30, cast=int)
+    TRUST_TOKEN_CLAIMS: bool = config("TRUST_TOKEN_CLAIMS", default=True, cast=bool)
+    PRINCIPAL_CACHE_TTL_SECONDS: float = config("PRINCIPAL_CACHE_TTL_SECONDS", default=60, cast=float)
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = config("PRINCIPAL_CACHE_MAX_ENTRIES", default=10000, cast=int)
     
     GOOGLE_CLIENT_ID: str = config("GOOGLE_CLIENT_ID", default="")
     GOOGLE_CLIENT_SECRET: str = config("GOOGLE_CLIENT_SECRET", default="")
     GOOGLE_REDIRECT_URI: str = config("GOOGLE_REDIRECT_URI", default="http://localhost:8000/auth/google/callback")
+    # Overridable so development and tests can point at a fake OAuth server (tools/fake_google_oauth.py)
+    GOOGLE_AUTH_URL: str = config("GOOGLE_AUTH_URL", default="https://accounts.google.com/o/oauth2/auth")
+    GOOGLE_TOKEN_URL: str = config("GOOGLE_TOKEN_URL", default="https://oauth2.googleapis.com/token")
+    GOOGLE_CERTS_URL: str = config("GOOGLE_CERTS_URL", default="https://www.googleapis.com/oauth2/v3/certs")
+    GOOGLE_ISSUERS: str = config("GOOGLE_ISSUERS", default="accounts.google.com,https://accounts.google.com")
+    GOOGLE_HTTP_POOL_SIZE: int = config("GOOGLE_HTTP_POOL_SIZE", default=10, cast=int)
+    GOOGLE_HTTP_TIMEOUT_SECONDS: float = config("GOOGLE_HTTP_TIMEOUT_SECONDS", default=10, cast=float)
+    JWKS_DEFAULT_MAX_AGE_SECONDS: int = config("JWKS_DEFAULT_MAX_AGE_SECONDS", default=3600, cast=int)
+    JWKS_MIN_REFRESH_SECONDS: float = config("JWKS_MIN_REFRESH_SECONDS", default=60, cast=float)
     
     FRONTEND_URL: str = config("FRONTEND_URL", default="http://localhost:3000")
 
     RAZORPAY_KEY_ID: str = config("RAZORPAY_KEY_ID", default="")
     RAZORPAY_KEY_SECRET: str = config("RAZORPAY_KEY_SECRET", default="")
+    RAZORPAY_BASE_URL: str = config("RAZORPAY_BASE_URL", default="")  # Point at a fake gateway in tests
+    PAYMENT_GATEWAY_POOL_SIZE: int = config("PAYMENT_GATEWAY_POOL_SIZE", default=10, cast=int)
+    PAYMENT_GATEWAY_TIMEOUT_SECONDS: float = config("PAYMENT_GATEWAY_TIMEOUT_SECONDS", default=10, cast=float)
+    PAYMENT_GATEWAY_MAX_ATTEMPTS: int = config("PAYMENT_GATEWAY_MAX_ATTEMPTS", default=3, cast=int)
+    PAYMENT_GATEWAY_RETRY_BASE_SECONDS: float = config("PAYMENT_GATEWAY_RETRY_BASE_SECONDS", default=0.2, cast=float)
+    PAYMENT_GATEWAY_FAILURE_THRESHOLD: int = config("PAYMENT_GATEWAY_FAILURE_THRESHOLD", default=5, cast=int)
+    PAYMENT_GATEWAY_RESET_SECONDS: float = config("PAYMENT_GATEWAY_RESET_SECONDS", default=30, cast=float)
+    DONATION_OUTBOX_GRACE_SECONDS: float = config("DONATION_OUTBOX_GRACE_SECONDS", default=300, cast=float)
+    DONATION_RECONCILE_INTERVAL_SECONDS: float = config("DONATION_RECONCILE_INTERVAL_SECONDS", default=600, cast=float)
+    # Donation ids each rollup remembers, so a re-driven donation is never counted twice
+    DONATION_REDRIVE_WINDOW: int = config("DONATION_REDRIVE_WINDOW", default=50, cast=int)
     GEMINI_KEY: str = config("GEMINI_KEY", default="")
+    IMPACT_MODEL: str = config("IMPACT_MODEL", default="gemini")  # "gemini" or "stub"
+    IMPACT_ANALYSIS_TIMEOUT_SECONDS: float = config("IMPACT_ANALYSIS_TIMEOUT_SECONDS", default=30, cast=float)
+
+    JOB_WORKERS: int = config("JOB_WORKERS", default=4, cast=int)
+    JOB_POLL_INTERVAL_SECONDS: float = config("JOB_POLL_INTERVAL_SECONDS", default=5, cast=float)
+    JOB_TIMEOUT_SECONDS: float = config("JOB_TIMEOUT_SECONDS", default=60, cast=float)
+    JOB_MAX_ATTEMPTS: int = config("JOB_MAX_ATTEMPTS", default=5, cast=int)
+    JOB_RETRY_BASE_SECONDS: float = config("JOB_RETRY_BASE_SECONDS", default=10, cast=float)
+    JOB_LEASE_SECONDS: float = config("JOB_LEASE_SECONDS", default=300, cast=float)
+
+    BCRYPT_ROUNDS: int = config("BCRYPT_ROUNDS", default=12, cast=int)
+    PASSWORD_HASH_WORKERS: int = config("PASSWORD_HASH_WORKERS", default=4, cast=int)
+    PASSWORD_HASH_MAX_PENDING: int = config("PASSWORD_HASH_MAX_PENDING", default=64, cast=int)
+
+    RATE_LIMIT_ENABLED: bool = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+    RATE_LIMIT_SHARDS: int = config("RATE_LIMIT_SHARDS", default=16, cast=int)
+    RATE_LIMIT_MAX_KEYS: int = config("RATE_LIMIT_MAX_KEYS", default=100000, cast=int)
+    # "<requests>/<seconds>": burst size, refilled evenly over the period
+    RATE_LIMIT_LOGIN_PER_IP: str = config("RATE_LIMIT_LOGIN_PER_IP", default="20/60")
+    RATE_LIMIT_LOGIN_PER_IP_ACCOUNT: str = config("RATE_LIMIT_LOGIN_PER_IP_ACCOUNT", default="5/300")
+    RATE_LIMIT_LOGIN_PER_ACCOUNT: str = config("RATE_LIMIT_LOGIN_PER_ACCOUNT", default="100/3600")
+    RATE_LIMIT_REGISTER_PER_IP: str = config("RATE_LIMIT_REGISTER_PER_IP", default="5/3600")
+
+    UPLOAD_STORAGE_BACKEND: str = config("UPLOAD_STORAGE_BACKEND", default="local")  # "local" or "s3"
+    UPLOAD_DIRECTORY: str = config("UPLOAD_DIRECTORY", default="static/uploads")
+    # Partial uploads are written here, outside every served directory; keep it on
+    # the same filesystem as UPLOAD_DIRECTORY so publishing is an atomic rename
+    UPLOAD_STAGING_DIRECTORY: str = config("UPLOAD_STAGING_DIRECTORY", default="upload-staging")
+    MAX_IMAGE_UPLOAD_BYTES: int = config("MAX_IMAGE_UPLOAD_BYTES", default=5 * 1024 * 1024, cast=int)
+    MAX_PDF_UPLOAD_BYTES: int = config("MAX_PDF_UPLOAD_BYTES", default=10 * 1024 * 1024, cast=int)
+    S3_ENDPOINT_URL: str = config("S3_ENDPOINT_URL", default="")
+    S3_BUCKET: str = config("S3_BUCKET", default="")
+    S3_PUBLIC_URL: str = config("S3_PUBLIC_URL", default="")
+    IMAGE_DERIVATIVE_WIDTHS: str = config("IMAGE_DERIVATIVE_WIDTHS", default="320,640,1280")
+    IMAGE_THUMBNAIL_SIZE: int = config("IMAGE_THUMBNAIL_SIZE", default=200, cast=int)
+    IMAGE_DERIVATIVE_QUALITY: int = config("IMAGE_DERIVATIVE_QUALITY", default=80, cast=int)
+
+    DONOR_SKETCH_ENABLED: bool = config("DONOR_SKETCH_ENABLED", default=False, cast=bool)
+    DONOR_SKETCH_PRECISION: int = config("DONOR_SKETCH_PRECISION", default=12, cast=int)
+
+    SEARCH_BACKEND: str = config("SEARCH_BACKEND", default="text")  # "text" or "memory"
+    SEARCH_INDEX_REFRESH_SECONDS: float = config("SEARCH_INDEX_REFRESH_SECONDS", default=60, cast=float)
+
+    RANKING_TOP_K: int = config("RANKING_TOP_K", default=50, cast=int)
+    RANKING_REFRESH_SECONDS: float = config("RANKING_REFRESH_SECONDS", default=60, cast=float)
+    TRENDING_DECAY_HOURS: float = config("TRENDING_DECAY_HOURS", default=48, cast=float)
+    TRENDING_REBUILD_SECONDS: float = config("TRENDING_REBUILD_SECONDS", default=3600, cast=float)
+
+    PROJECT_CACHE_TTL_SECONDS: float = config("PROJECT_CACHE_TTL_SECONDS", default=30, cast=float)
+    PROJECT_CACHE_MAX_ENTRIES: int = config("PROJECT_CACHE_MAX_ENTRIES", default=256, cast=int)
+
+    COMPRESSION_MINIMUM_SIZE: int = config("COMPRESSION_MINIMUM_SIZE", default=1024, cast=int)
+    COMPRESSION_GZIP_LEVEL: int = config("COMPRESSION_GZIP_LEVEL", default=6, cast=int)
+    COMPRESSION_BROTLI_QUALITY: int = config("COMPRESSION_BROTLI_QUALITY", default=4, cast=int)
+    ETAG_WINDOW_SECONDS: float = config("ETAG_WINDOW_SECONDS", default=30, cast=float)
+
+    SSE_SOURCE: str = config("SSE_SOURCE", default="local")  # "local" or "change_stream"
+    SSE_CLIENT_BUFFER: int = config("SSE_CLIENT_BUFFER", default=32, cast=int)
+    SSE_MAX_CLIENTS: int = config("SSE_MAX_CLIENTS", default=10000, cast=int)
+    SSE_HEARTBEAT_SECONDS: float = config("SSE_HEARTBEAT_SECONDS", default=15, cast=float)
+    SSE_RETRY_MS: int = config("SSE_RETRY_MS", default=3000, cast=int)
+
+    METRICS_ENABLED: bool = config("METRICS_ENABLED", default=True, cast=bool)
+    TRACING_EXPORTER: str = config("TRACING_EXPORTER", default="none")  # "none", "json" or "otlp-file"
+    TRACING_OTLP_FILE: str = config("TRACING_OTLP_FILE", default="traces/spans.jsonl")
+    TRACING_SERVICE_NAME: str = config("TRACING_SERVICE_NAME", default="webweavers-backend")
+    LOOP_MONITOR_ENABLED: bool = config("LOOP_MONITOR_ENABLED", default=True, cast=bool)
+    LOOP_MONITOR_INTERVAL_MS: float = config("LOOP_MONITOR_INTERVAL_MS", default=50, cast=float)
+    LOOP_BLOCK_THRESHOLD_MS: float = config("LOOP_BLOCK_THRESHOLD_MS", default=100, cast=float)
+
+    READINESS_CHECK_TIMEOUT_SECONDS: float = config("READINESS_CHECK_TIMEOUT_SECONDS", default=1.0, cast=float)
+    READINESS_CACHE_SECONDS: float = config("READINESS_CACHE_SECONDS", default=2.0, cast=float)
+    READINESS_MAX_POOL_UTILIZATION: float = config("READINESS_MAX_POOL_UTILIZATION", default=0.95, cast=float)
+    READINESS_MAX_LOOP_LAG_MS: float = config("READINESS_MAX_LOOP_LAG_MS", default=500, cast=float)
+    SHUTDOWN_PRESTOP_SECONDS: float = config("SHUTDOWN_PRESTOP_SECONDS", default=5, cast=float)
+    SHUTDOWN_DRAIN_SECONDS: float = config("SHUTDOWN_DRAIN_SECONDS", default=15, cast=float)
 
 settings = Settings()
\ No newline at end of file
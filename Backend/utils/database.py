@@ -1,5 +1,10 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo.read_preferences import Primary, SecondaryPreferred
 from .config import settings
+from .indexes import ensure_indexes
+from .metrics import mongo_command_metrics
+from .mongo_pool import pool_metrics
+from .tracing import mongo_command_tracer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -7,29 +12,64 @@ logger = logging.getLogger(__name__)
 class Database:
     client: AsyncIOMotorClient = None
     db = None
+    secondary_db = None
+
+    @property
+    def read_db(self):
+        """Database handle for reads that tolerate replication lag, such as listings"""
+        return self.secondary_db if self.secondary_db is not None else self.db
 
 # --- Define collection variables here, initially as None ---
 db_connection = Database()
 user_collection: AsyncIOMotorCollection = None
 project_collection: AsyncIOMotorCollection = None
 donation_collection: AsyncIOMotorCollection = None
+job_collection: AsyncIOMotorCollection = None
+project_donor_collection: AsyncIOMotorCollection = None
+
+def client_options() -> dict:
+    """Pool, timeout and compression options for the MongoDB client"""
+    options = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [pool_metrics, mongo_command_metrics, mongo_command_tracer],
+    }
+    if settings.MONGODB_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = settings.MONGODB_MAX_IDLE_TIME_MS
+    if settings.MONGODB_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = settings.MONGODB_SOCKET_TIMEOUT_MS
+    if settings.MONGODB_COMPRESSORS:
+        options["compressors"] = settings.MONGODB_COMPRESSORS
+    return options
 
 async def get_database():
     return db_connection.db
 
-async def connect_to_mongo():
+async def connect_to_mongo(apply_indexes: bool = True):
     """Create database connection and initialize collections"""
-    global user_collection, project_collection, donation_collection
+    global user_collection, project_collection, donation_collection, job_collection, project_donor_collection
     try:
-        db_connection.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        db_connection.client = AsyncIOMotorClient(settings.MONGODB_URL, **client_options())
         db_connection.db = db_connection.client[settings.DATABASE_NAME]
+        # On a standalone server secondaryPreferred simply reads from the primary
+        db_connection.secondary_db = db_connection.client.get_database(
+            settings.DATABASE_NAME,
+            read_preference=SecondaryPreferred(max_staleness=settings.MONGODB_MAX_STALENESS_SECONDS)
+            if settings.MONGODB_SECONDARY_READS else Primary()
+        )
         
         # --- Initialize the collection variables after connecting ---
         user_collection = db_connection.db.get_collection("users")
         project_collection = db_connection.db.get_collection("projects")
         donation_collection = db_connection.db.get_collection("donations")
+        job_collection = db_connection.db.get_collection("jobs")
+        project_donor_collection = db_connection.db.get_collection("project_donors")
 
-        await create_indexes()
+        if apply_indexes:
+            await create_indexes()
         
         logger.info("Connected to MongoDB and collections initialized")
     except Exception as e:
@@ -43,7 +83,9 @@ async def close_mongo_connection():
         logger.info("Disconnected from MongoDB")
 
 async def create_indexes():
-    """Create database indexes"""
-    if user_collection is not None:
-        await user_collection.create_index("email", unique=True)
-        await user_collection.create_index("google_id", sparse=True)
\ No newline at end of file
+    """Apply the index registry"""
+    if await ensure_indexes(db_connection.db):
+        return
+    if settings.MONGODB_REQUIRE_INDEXES:
+        raise RuntimeError("Some registered indexes could not be created")
+    logger.warning("Starting without some registered indexes; affected queries may scan whole collections")
@@ -0,0 +1,193 @@
+"""Liveness, readiness and graceful drain for load balancer probes.
+
+Liveness only says the event loop is answering. Readiness checks the
+dependencies a request needs: a MongoDB ping, pool headroom and event loop
+lag. Job queue depth is reported but never fails readiness, since the queue
+is shared by every worker. Results are cached for READINESS_CACHE_SECONDS so
+frequent probes from several balancers cost one check.
+
+Drain starts at the shutdown signal, not in the lifespan: by the time the
+lifespan shuts down, uvicorn has already closed its listener and waited for
+open connections. The signal hook fails readiness straight away and holds
+the signal back from uvicorn for SHUTDOWN_PRESTOP_SECONDS, so balancers see
+the 503 and stop routing here while the listener still accepts requests.
+"""
+import asyncio
+import logging
+import signal
+import time
+from typing import Callable, List, Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .config import settings
+from .database import db_connection
+from .jobs import job_queue
+from .mongo_pool import pool_metrics
+from .tracing import loop_monitor
+
+logger = logging.getLogger(__name__)
+
+class ReadinessProbe:
+    def __init__(self):
+        self.draining = False
+        self._signalled = False
+        self._prestop: Optional[asyncio.TimerHandle] = None
+        self._drain_callbacks: List[Callable[[], None]] = []
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def check(self) -> dict:
+        """Readiness report; result["ready"] decides between 200 and 503"""
+        if self.draining:
+            return {"ready": False, "status": "draining", "checks": {}}
+        if self._result is not None and time.monotonic() - self._checked_at < settings.READINESS_CACHE_SECONDS:
+            return self._result
+        async with self._lock:
+            # A concurrent probe may have refreshed the result while this one waited
+            if self._result is None or time.monotonic() - self._checked_at >= settings.READINESS_CACHE_SECONDS:
+                self._result = await self._run_checks()
+                self._checked_at = time.monotonic()
+        return self._result
+
+    async def _run_checks(self) -> dict:
+        mongo, queue = await asyncio.gather(self._check_mongo(), self._check_job_queue())
+        checks = {
+            "mongodb": mongo,
+            "mongodb_pool": self._check_pool(),
+            "event_loop": await self._check_loop_lag(),
+            "job_queue": queue,
+        }
+        ready = all(check["ok"] for name, check in checks.items() if name != "job_queue")
+        if not ready:
+            failing = [name for name, check in checks.items() if not check["ok"]]
+            logger.warning(f"Readiness check failed: {', '.join(failing)}")
+        return {"ready": ready, "status": "ready" if ready else "not_ready", "checks": checks}
+
+    async def _check_mongo(self) -> dict:
+        if db_connection.client is None:
+            return {"ok": False, "error": "not connected"}
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(db_connection.client.admin.command("ping"), settings.READINESS_CHECK_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": f"ping timed out after {settings.READINESS_CHECK_TIMEOUT_SECONDS}s"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def _check_pool(self) -> dict:
+        pools = pool_metrics.snapshot()
+        max_size = settings.MONGODB_MAX_POOL_SIZE
+        # maxPoolSize is a per-server limit, so the busiest server's pool decides; 0 means unbounded
+        busiest, checked_out = max(
+            ((address, stats["checked_out"]) for address, stats in pools.items()),
+            key=lambda pool: pool[1], default=(None, 0)
+        )
+        utilization = checked_out / max_size if max_size else 0.0
+        return {
+            "ok": utilization < settings.READINESS_MAX_POOL_UTILIZATION,
+            "busiest_server": busiest,
+            "checked_out": checked_out,
+            "connections": sum(stats["connections"] for stats in pools.values()),
+            "max_pool_size": max_size,
+            "utilization": round(utilization, 3),
+        }
+
+    async def _check_loop_lag(self) -> dict:
+        if loop_monitor.running:
+            lag = loop_monitor.last_lag
+        else:
+            # Without the heartbeat, time one trip through the ready queue
+            started = time.perf_counter()
+            await asyncio.sleep(0)
+            lag = time.perf_counter() - started
+        lag_ms = round(lag * 1000, 2)
+        return {"ok": lag_ms < settings.READINESS_MAX_LOOP_LAG_MS, "lag_ms": lag_ms}
+
+    async def _check_job_queue(self) -> dict:
+        try:
+            depth = await asyncio.wait_for(job_queue.queue_depth(), settings.READINESS_CHECK_TIMEOUT_SECONDS)
+        except Exception as e:
+            return {"ok": False, "error": str(e) or type(e).__name__}
+        return {"ok": True, "depth": depth}
+
+    def on_drain(self, callback: Callable[[], None]) -> None:
+        """Run callback when drain starts, e.g. to end connections that never finish by themselves"""
+        self._drain_callbacks.append(callback)
+
+    def start_draining(self) -> None:
+        """Fail readiness from now on; safe to call more than once"""
+        if self.draining:
+            return
+        self.draining = True
+        logger.info("Draining: readiness now fails")
+        for callback in self._drain_callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception(f"Drain callback {callback!r} failed")
+
+    def install_signal_hook(self) -> None:
+        """Start draining on SIGTERM/SIGINT and pass the signal on to the server after the pre-stop delay.
+
+        Called from the lifespan startup, after uvicorn has installed its own
+        handlers: on the event loop before uvicorn 0.29, with signal.signal since.
+        """
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            handle = getattr(loop, "_signal_handlers", {}).get(sig)
+            if handle is not None:
+                forward = _bind(handle._callback, *handle._args)
+                loop.add_signal_handler(sig, self._on_signal, loop, forward)
+                continue
+            previous = signal.getsignal(sig)
+            if not callable(previous) or previous is signal.default_int_handler:
+                # No server handler to defer; nothing to hook
+                continue
+            signal.signal(sig, lambda signum, frame, previous=previous: self._on_signal(
+                loop, _bind(previous, signum, frame)
+            ))
+
+    def _on_signal(self, loop: asyncio.AbstractEventLoop, forward: Callable[[], None]) -> None:
+        if self._signalled:
+            # A second signal skips whatever is left of the pre-stop delay
+            if self._prestop is not None:
+                self._prestop.cancel()
+                self._prestop = None
+            forward()
+            return
+        self._signalled = True
+        loop.call_soon_threadsafe(self._begin_prestop, loop, forward)
+
+    def _begin_prestop(self, loop: asyncio.AbstractEventLoop, forward: Callable[[], None]) -> None:
+        self.start_draining()
+        logger.info(f"Shutdown signal received; stopping in {settings.SHUTDOWN_PRESTOP_SECONDS:g}s")
+        self._prestop = loop.call_later(settings.SHUTDOWN_PRESTOP_SECONDS, self._end_prestop, forward)
+
+    def _end_prestop(self, forward: Callable[[], None]) -> None:
+        self._prestop = None
+        forward()
+
+def _bind(func: Callable, *args) -> Callable[[], None]:
+    return lambda: func(*args)
+
+readiness_probe = ReadinessProbe()
+
+class DrainMiddleware:
+    """Asks clients to reconnect elsewhere while draining instead of reusing this connection"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and readiness_probe.draining:
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"connection", b"close")]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
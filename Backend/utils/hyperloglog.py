@@ -0,0 +1,43 @@
+import hashlib
+import math
+from typing import Dict, Tuple
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch (Flajolet et al.) with the small-range correction.
+
+    Registers live outside this class as a sparse {index: rank} mapping, so they
+    can be stored in MongoDB and merged atomically with $max on "r.<index>".
+    With the default precision of 12 (4096 registers) the standard error is
+    about 1.6%.
+    """
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.register_count = 1 << precision
+        self._value_bits = 64 - precision
+        if self.register_count >= 128:
+            self._alpha = 0.7213 / (1 + 1.079 / self.register_count)
+        else:
+            self._alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self.register_count]
+
+    def register_update(self, value: str) -> Tuple[int, int]:
+        """Return the (register index, rank) that adding value contributes"""
+        hashed = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+        index = hashed >> self._value_bits
+        remainder = hashed & ((1 << self._value_bits) - 1)
+        # Rank is the position of the leftmost 1-bit in the remaining bits
+        rank = self._value_bits - remainder.bit_length() + 1
+        return index, rank
+
+    def estimate(self, registers: Dict[int, int]) -> int:
+        """Estimate the number of distinct values from sparse registers"""
+        m = self.register_count
+        zeros = m - len(registers)
+        harmonic = zeros + sum(2.0 ** -rank for rank in registers.values())
+        raw = self._alpha * m * m / harmonic
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            return round(m * math.log(m / zeros))
+        return round(raw)
@@ -0,0 +1,261 @@
+"""Index registry: every index the services rely on, declared per collection.
+
+ensure_indexes() applies the registry at startup. Creating an index that
+already exists with the same keys and options is a no-op, so this is safe to
+run on every boot. query_shapes() lists the filters, sorts and aggregation
+pipelines the services issue so `python manage.py --check-plans` can confirm
+each one uses an index.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, TEXT
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Relevance weights for project search, shared with the in-memory fallback index
+PROJECT_TEXT_WEIGHTS = {"title": 10, "location": 5, "description": 1}
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("google_id", ASCENDING)], sparse=True),
+    ],
+    "projects": [
+        # Keyset pagination for approved listings, optionally narrowed by filters
+        IndexModel([("status", ASCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("raisedAmount", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("category", ASCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("location", ASCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("needsVolunteers", ASCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("category", ASCENDING), ("raisedAmount", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("location", ASCENDING), ("raisedAmount", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("needsVolunteers", ASCENDING), ("raisedAmount", DESCENDING), ("_id", DESCENDING)]),
+        # Moderation queue, oldest submission first
+        IndexModel([("status", ASCENDING), ("submitted_at", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel(
+            [(field, TEXT) for field in PROJECT_TEXT_WEIGHTS],
+            weights=PROJECT_TEXT_WEIGHTS,
+            name="project_text"
+        ),
+        # Only projects with donations in the trending window carry a score
+        IndexModel(
+            [("trendingScore", ASCENDING)],
+            partialFilterExpression={"trendingScore": {"$gt": 0}}
+        ),
+    ],
+    "donations": [
+        # One donation per gateway payment, so retried verifications are idempotent
+        IndexModel(
+            [("transaction_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"transaction_id": {"$type": "string"}}
+        ),
+        # Outbox entries stuck before "applied", by the server time they were recorded or claimed
+        IndexModel([("counter_state", ASCENDING), ("recorded_at", ASCENDING)]),
+        IndexModel([("counter_state", ASCENDING), ("counter_claimed_at", ASCENDING)]),
+        IndexModel([("email", ASCENDING)]),
+        IndexModel([("project_id", ASCENDING)]),
+        # Trending window, by server time
+        IndexModel([("recorded_at", ASCENDING)]),
+    ],
+    "project_donors": [
+        IndexModel([("project_id", ASCENDING), ("donor", ASCENDING)], unique=True),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)]),
+        # Reclaiming jobs whose worker lease expired
+        IndexModel([("status", ASCENDING), ("locked_at", ASCENDING)]),
+    ],
+}
+
+class UniqueIndexError(Exception):
+    """A unique index could not be created, typically because of existing duplicates"""
+
+async def ensure_indexes(db) -> bool:
+    """Create every registered index; returns False if any could not be created.
+
+    Raises UniqueIndexError when a unique index fails, whatever MONGODB_REQUIRE_INDEXES says.
+    """
+    ok = True
+    for collection_name, models in INDEXES.items():
+        collection = db.get_collection(collection_name)
+        # One at a time, so a single bad index cannot keep the others from being built
+        for model in models:
+            name = model.document["name"]
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                if model.document.get("unique"):
+                    # Duplicate-write protection depends on it; never run without it
+                    raise UniqueIndexError(
+                        f"Unique index {collection_name}.{name} could not be created: {e}. "
+                        f"Remove the duplicates (python manage.py --dedupe-donations for payments) and restart."
+                    )
+                # Usually an existing index with the same name or keys but different options
+                logger.error(f"Could not create index {collection_name}.{name}: {e}")
+                ok = False
+        registered = {model.document["name"] for model in models} | {"_id_"}
+        existing = await collection.index_information()
+        for name in existing.keys() - registered:
+            logger.warning(f"Index {collection_name}.{name} is not in the index registry")
+    return ok
+
+# Representative values stand in for request parameters; the planner only
+# cares about which fields are constrained and how.
+def query_shapes() -> List[dict]:
+    # Imported here: the job queue depends on the database module, which imports this one
+    from .jobs import job_queue
+
+    now = datetime.utcnow()
+    project_id = str(ObjectId())
+    return [
+        # users
+        {"name": "user by email", "collection": "users", "filter": {"email": "donor@example.com"}},
+        {"name": "user by google id", "collection": "users", "filter": {"google_id": "1234567890"}},
+        # projects
+        {"name": "project by id", "collection": "projects", "filter": {"_id": ObjectId()}},
+        {"name": "approved listing, newest", "collection": "projects",
+         "filter": {"status": "approved", "_id": {"$lt": ObjectId()}}, "sort": [("_id", -1)]},
+        {"name": "approved listing, most raised", "collection": "projects",
+         "filter": {"status": "approved"}, "sort": [("raisedAmount", -1), ("_id", -1)]},
+        {"name": "approved listing by category", "collection": "projects",
+         "filter": {"status": "approved", "category": "Health"}, "sort": [("_id", -1)]},
+        {"name": "approved listing by location", "collection": "projects",
+         "filter": {"status": "approved", "location": "Pune"}, "sort": [("_id", -1)]},
+        {"name": "approved listing needing volunteers", "collection": "projects",
+         "filter": {"status": "approved", "needsVolunteers": True}, "sort": [("_id", -1)]},
+        {"name": "approved listing by category, most raised", "collection": "projects",
+         "filter": {"status": "approved", "category": "Health"}, "sort": [("raisedAmount", -1), ("_id", -1)]},
+        {"name": "approved listing by location, most raised", "collection": "projects",
+         "filter": {"status": "approved", "location": "Pune"}, "sort": [("raisedAmount", -1), ("_id", -1)]},
+        {"name": "approved listing needing volunteers, most raised", "collection": "projects",
+         "filter": {"status": "approved", "needsVolunteers": True}, "sort": [("raisedAmount", -1), ("_id", -1)]},
+        {"name": "moderation queue", "collection": "projects",
+         "filter": {"status": "pending"}, "sort": [("submitted_at", 1), ("_id", 1)]},
+        {"name": "moderation results", "collection": "projects",
+         "filter": {"_id": {"$in": [ObjectId(), ObjectId()]}}},
+        {"name": "project search with facets", "collection": "projects",
+         "pipeline": [
+             {"$match": {"$text": {"$search": "water"}, "status": "approved"}},
+             {"$addFields": {"score": {"$meta": "textScore"}}},
+             {"$facet": {"items": [{"$sort": {"score": -1, "_id": -1}}, {"$limit": 21}], "total": [{"$count": "count"}]}},
+         ]},
+        {"name": "stale trending scores", "collection": "projects",
+         "filter": {"_id": {"$nin": [ObjectId()]}, "trendingScore": {"$gt": 0}}},
+        # donations
+        {"name": "donation by payment id", "collection": "donations",
+         "filter": {"transaction_id": {"$eq": "pay_123", "$type": "string"}}},
+        {"name": "stuck pending donations", "collection": "donations",
+         "filter": {"counter_state": "pending", "recorded_at": {"$not": {"$gte": now}}}},
+        {"name": "stuck applying donations", "collection": "donations",
+         "filter": {"counter_state": "applying", "counter_claimed_at": {"$lt": now}}},
+        {"name": "donations in flight", "collection": "donations",
+         "filter": {"counter_state": {"$in": ["pending", "applying"]}}},
+        {"name": "applied donation totals", "collection": "donations",
+         "pipeline": [
+             {"$match": {"status": "completed", "counter_state": {"$in": ["applied", None]}}},
+             {"$group": {"_id": "$project_id", "raisedAmount": {"$sum": "$amount"}}},
+         ]},
+        {"name": "donor history", "collection": "donations",
+         "pipeline": [
+             {"$match": {"status": "completed", "counter_state": {"$in": ["applied", None]}, "email": "donor@example.com"}},
+             {"$group": {"_id": "$email", "totalDonated": {"$sum": "$amount"}}},
+         ]},
+        {"name": "history of donors with an email", "collection": "donations",
+         "pipeline": [
+             {"$match": {"status": "completed", "counter_state": {"$in": ["applied", None]}, "email": {"$type": "string"}}},
+             {"$group": {"_id": "$email", "totalDonated": {"$sum": "$amount"}}},
+         ]},
+        {"name": "distinct donors of projects", "collection": "donations",
+         "pipeline": [
+             {"$match": {"project_id": {"$in": [project_id]}, "status": "completed"}},
+             {"$group": {"_id": {"project_id": "$project_id", "donor": "$email"}}},
+         ]},
+        {"name": "donor history of a project", "collection": "donations",
+         "pipeline": [
+             {"$match": {"project_id": project_id, "status": "completed"}},
+             {"$group": {"_id": "$email"}},
+         ]},
+        {"name": "recent donations", "collection": "donations",
+         "pipeline": [
+             {"$match": {"status": "completed", "recorded_at": {"$gte": now - timedelta(days=10)}}},
+             {"$group": {"_id": "$project_id", "score": {"$sum": "$amount"}}},
+         ]},
+        # Rebuilding donor counters reads every donation by design
+        {"name": "all completed donations", "collection": "donations",
+         "pipeline": [
+             {"$match": {"status": "completed"}},
+             {"$group": {"_id": {"project_id": "$project_id", "donor": "$email"}}},
+         ], "full_scan": True},
+        {"name": "project donor", "collection": "project_donors",
+         "filter": {"project_id": project_id, "donor": "donor@example.com"}},
+        {"name": "user stats rollup", "collection": "user_stats", "filter": {"_id": "donor@example.com"}},
+        # jobs
+        {"name": "claim job", "collection": "jobs",
+         "filter": {
+             "type": {"$in": job_queue.job_types},
+             "$or": [
+                 {"status": "queued", "run_at": {"$lte": now}},
+                 {"status": "running", "locked_at": {"$lte": now}},
+             ]
+         }, "sort": [("run_at", 1)]},
+        {"name": "job queue depth", "collection": "jobs", "filter": {"status": "queued"}},
+    ]
+
+def plan_stages(plan: dict) -> Iterator[str]:
+    """Yield every stage name in an explain() plan tree, classic or slot-based"""
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            yield from plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+    for shard in plan.get("shards", []):
+        yield from plan_stages(shard.get("winningPlan", {}))
+
+async def explain_shape(db, shape: dict) -> dict:
+    """The winning plan for a shape's find or aggregation"""
+    collection = db.get_collection(shape["collection"])
+    if "pipeline" in shape:
+        # PyMongo refuses aggregate(explain=True), so run the explain command directly
+        explanation = await db.command(
+            "explain",
+            {"aggregate": shape["collection"], "pipeline": shape["pipeline"], "cursor": {}},
+            verbosity="queryPlanner"
+        )
+        return _aggregate_winning_plan(explanation)
+    cursor = collection.find(shape["filter"])
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    explanation = await cursor.explain()
+    return explanation["queryPlanner"]["winningPlan"]
+
+def _aggregate_winning_plan(explanation: dict) -> dict:
+    # A pipeline the server pushes down entirely reports a plain queryPlanner;
+    # otherwise the plan sits in the first stage's $cursor, per shard when sharded
+    if "queryPlanner" in explanation:
+        return explanation["queryPlanner"]["winningPlan"]
+    for stage in explanation.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]["queryPlanner"]["winningPlan"]
+    for shard in explanation.get("shards", {}).values():
+        return _aggregate_winning_plan(shard)
+    return {}
+
+async def check_query_plans(db) -> bool:
+    """Explain every query shape; returns False if any unexpected COLLSCAN is found"""
+    ok = True
+    for shape in query_shapes():
+        stages = list(plan_stages(await explain_shape(db, shape)))
+        if "COLLSCAN" not in stages:
+            logger.info(f"ok        {shape['collection']}: {shape['name']} ({' <- '.join(stages)})")
+        elif shape.get("full_scan"):
+            logger.info(f"expected  {shape['collection']}: {shape['name']} (full scan by design)")
+        else:
+            logger.error(f"COLLSCAN  {shape['collection']}: {shape['name']}")
+            ok = False
+    return ok
@@ -0,0 +1,52 @@
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "to", "was", "with",
+})
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+class InvertedIndex:
+    """In-memory weighted full-text index over documents with string fields.
+
+    Postings map each term to {doc_id: weighted term frequency}; queries match
+    any term (like MongoDB $text) and score with tf-idf so rarer terms count more.
+    Field weights should be at least 1.
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = weights
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self.documents: Dict[str, dict] = {}
+
+    def build(self, documents: Iterable[Tuple[str, dict]]):
+        postings: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        stored = {}
+        for doc_id, document in documents:
+            stored[doc_id] = document
+            for field, weight in self.weights.items():
+                for token in tokenize(document.get(field) or ""):
+                    postings[token][doc_id] += weight
+        # Swap in the finished index so readers never see a partial build
+        self._postings = {term: dict(docs) for term, docs in postings.items()}
+        self.documents = stored
+
+    def search(self, query: str) -> Dict[str, float]:
+        """Relevance score for every document matching at least one query term"""
+        scores: Dict[str, float] = defaultdict(float)
+        total = len(self.documents) or 1
+        for term in set(tokenize(query)):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + total / len(docs))
+            for doc_id, weighted_tf in docs.items():
+                # Sublinear tf so a term repeated in a long description does not dominate
+                scores[doc_id] += (1 + math.log(weighted_tf)) * idf
+        return scores
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .config import settings
+from .database import db_connection
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+class JobType:
+    def __init__(self, handler: JobHandler, timeout: float, max_attempts: int, every: Optional[float] = None):
+        self.handler = handler
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.every = every
+
+class JobQueue:
+    """Background job queue persisted in MongoDB and drained by a pool of asyncio workers.
+
+    Jobs survive restarts: a job left "running" by a crashed worker is picked
+    up again once its lease expires. A periodic job type has a single job
+    document, shared by every process, that is queued again after each run.
+    """
+
+    def __init__(self, collection_name: str = "jobs"):
+        self.collection_name = collection_name
+        self._job_types: Dict[str, JobType] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def collection(self):
+        return db_connection.db.get_collection(self.collection_name)
+
+    @property
+    def job_types(self) -> List[str]:
+        """Registered job type names, as matched when claiming jobs"""
+        return list(self._job_types)
+
+    def register(
+        self,
+        job_type: str,
+        handler: JobHandler,
+        timeout: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        every: Optional[float] = None
+    ):
+        """Register the coroutine that processes jobs of the given type; with `every`, run it every that many seconds"""
+        self._job_types[job_type] = JobType(
+            handler,
+            timeout or settings.JOB_TIMEOUT_SECONDS,
+            max_attempts or settings.JOB_MAX_ATTEMPTS,
+            every
+        )
+
+    async def enqueue(self, job_type: str, payload: dict) -> str:
+        """Persist a job and wake an idle worker"""
+        if job_type not in self._job_types:
+            raise ValueError(f"Unknown job type: {job_type}")
+        now = datetime.utcnow()
+        result = await self.collection.insert_one({
+            "type": job_type,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "run_at": now,
+            "created_at": now,
+            "updated_at": now
+        })
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return str(result.inserted_id)
+
+    async def queue_depth(self) -> int:
+        return await self.collection.count_documents({"status": "queued"})
+
+    async def start(self, workers: Optional[int] = None):
+        await self._schedule_periodic()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        for index in range(workers or settings.JOB_WORKERS):
+            self._workers.append(asyncio.create_task(self._work(), name=f"job-worker-{index}"))
+        logger.info(f"Started {len(self._workers)} job workers")
+
+    async def stop(self, timeout: float = 0):
+        """Stop the workers, first giving running jobs up to `timeout` seconds to finish"""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if timeout and self._workers:
+            await asyncio.wait(self._workers, timeout=timeout)
+        # Jobs still running are cancelled; their lease expires and another worker reclaims them
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Stopped job workers")
+
+    async def _schedule_periodic(self):
+        """Create the job document of each periodic job type, unless another process already has"""
+        now = datetime.utcnow()
+        for name, job_type in self._job_types.items():
+            if job_type.every is None:
+                continue
+            try:
+                await self.collection.update_one(
+                    {"_id": f"periodic:{name}"},
+                    {"$setOnInsert": {
+                        "type": name,
+                        "payload": {},
+                        "status": "queued",
+                        "attempts": 0,
+                        "run_at": now,
+                        "created_at": now,
+                        "updated_at": now
+                    }},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                pass  # Scheduled concurrently by another process
+
+    def _next_run(self, job_type: JobType, now: datetime) -> dict:
+        return {"status": "queued", "attempts": 0, "run_at": now + timedelta(seconds=job_type.every), "updated_at": now}
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        lease_expired = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        return await self.collection.find_one_and_update(
+            {
+                "type": {"$in": self.job_types},
+                "$or": [
+                    {"status": "queued", "run_at": {"$lte": now}},
+                    {"status": "running", "locked_at": {"$lte": lease_expired}}
+                ]
+            },
+            {"$set": {"status": "running", "locked_at": now, "updated_at": now}, "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _work(self):
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                if self._stopping:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Recording the outcome failed; the lease expires and the job is retried
+                logger.error(f"Error finishing job {job['_id']} ({job['type']}): {e}")
+
+    async def _run(self, job: dict):
+        job_type = self._job_types[job["type"]]
+        if job["attempts"] > job_type.max_attempts:
+            # Reclaimed after lease expiry once too often: the job keeps killing or hanging its worker
+            await self._fail(job, job_type, RuntimeError("Lease expired on every attempt"))
+            return
+        try:
+            await asyncio.wait_for(job_type.handler(job["payload"]), job_type.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._fail(job, job_type, e)
+            return
+        now = datetime.utcnow()
+        update = self._next_run(job_type, now) if job_type.every else {"status": "done", "updated_at": now}
+        await self.collection.update_one({"_id": job["_id"]}, {"$set": update, "$unset": {"locked_at": ""}})
+
+    async def _fail(self, job: dict, job_type: JobType, error: Exception):
+        now = datetime.utcnow()
+        attempts = job["attempts"]
+        error_message = repr(error)
+        if attempts >= job_type.max_attempts and job_type.every:
+            logger.error(f"Periodic job {job['type']} failed {attempts} times, skipping to its next run: {error_message}")
+            update = {**self._next_run(job_type, now), "last_error": error_message}
+        elif attempts >= job_type.max_attempts:
+            logger.error(f"Job {job['_id']} ({job['type']}) failed permanently: {error_message}")
+            update = {"status": "failed", "last_error": error_message, "updated_at": now}
+        else:
+            # Exponential backoff with jitter so retries from a failed batch spread out
+            delay = min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), 300) * random.uniform(0.5, 1.0)
+            logger.warning(f"Job {job['_id']} ({job['type']}) failed, retrying in {delay:.1f}s: {error_message}")
+            update = {
+                "status": "queued",
+                "run_at": now + timedelta(seconds=delay),
+                "last_error": error_message,
+                "updated_at": now
+            }
+        await self.collection.update_one({"_id": job["_id"]}, {"$set": update, "$unset": {"locked_at": ""}})
+
+job_queue = JobQueue()
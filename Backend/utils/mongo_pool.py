@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from typing import Dict
+from pymongo import monitoring
+from .metrics import CallbackMetric, MONGODB_POOL_WAIT, registry
+
+logger = logging.getLogger(__name__)
+
+class PoolStats:
+    def __init__(self):
+        self.connections = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.clears = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "connections": self.connections,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "wait_seconds_avg": self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+            "clears": self.clears,
+        }
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool gauges per server, fed by PyMongo's CMAP events.
+
+    Events fire synchronously on the thread checking the connection out, so
+    the wait time is measured between the started and checked-out events on
+    that thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, PoolStats] = {}
+        self._checkout_started = threading.local()
+
+    def _stats(self, address) -> PoolStats:
+        key = f"{address[0]}:{address[1]}"
+        stats = self._pools.get(key)
+        if stats is None:
+            stats = self._pools[key] = PoolStats()
+        return stats
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {address: stats.as_dict() for address, stats in self._pools.items()}
+
+    def pool_created(self, event):
+        with self._lock:
+            self._stats(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._stats(event.address).clears += 1
+        logger.warning(f"MongoDB connection pool for {event.address} was cleared")
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._stats(event.address).connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.connections = max(stats.connections - 1, 0)
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._checkout_started.value = None
+        with self._lock:
+            self._stats(event.address).checkout_failures += 1
+        logger.warning(f"MongoDB connection checkout failed for {event.address}: {event.reason}")
+
+    def connection_checked_out(self, event):
+        started = getattr(self._checkout_started, "value", None)
+        self._checkout_started.value = None
+        waited = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.checked_out += 1
+            stats.checkouts += 1
+            stats.wait_seconds_total += waited
+            stats.wait_seconds_max = max(stats.wait_seconds_max, waited)
+        MONGODB_POOL_WAIT.observe(waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.checked_out = max(stats.checked_out - 1, 0)
+
+pool_metrics = PoolMetrics()
+
+registry.register(CallbackMetric(
+    "mongodb_pool_connections", "Open MongoDB connections per server", ("address",),
+    lambda: [((address,), stats["connections"]) for address, stats in pool_metrics.snapshot().items()]
+))
+registry.register(CallbackMetric(
+    "mongodb_pool_checked_out", "MongoDB connections currently checked out per server", ("address",),
+    lambda: [((address,), stats["checked_out"]) for address, stats in pool_metrics.snapshot().items()]
+))
+registry.register(CallbackMetric(
+    "mongodb_pool_checkout_failures_total", "Failed MongoDB connection checkouts per server", ("address",),
+    lambda: [((address,), stats["checkout_failures"]) for address, stats in pool_metrics.snapshot().items()],
+    kind="counter"
+))
@@ -0,0 +1,51 @@
+import base64
+import json
+import math
+from typing import Dict, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+def encode_cursor(data: dict) -> str:
+    """Encode keyset position into an opaque, URL-safe cursor"""
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Cursor values end up inside query operators, so they must be plain scalars
+NUMBER = "number"
+
+def _check_value(value, kind) -> bool:
+    if kind == NUMBER:
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    return isinstance(value, kind)
+
+def decode_cursor(
+    cursor: Optional[str],
+    sort: Optional[str] = None,
+    fields: Optional[Dict[str, Tuple]] = None,
+) -> Optional[dict]:
+    """Decode a cursor produced by encode_cursor, checking it matches the sort order.
+
+    fields maps each position key the caller reads to the kinds it may hold
+    (NUMBER or a type); a missing key or any other value is rejected.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(data, dict):
+            raise ValueError("cursor is not an object")
+        last_id = data.get("id")
+        if not isinstance(last_id, str) or len(last_id) != 24 or not ObjectId.is_valid(last_id):
+            raise ValueError("cursor is missing a valid id")
+        if sort is not None and data.get("sort") != sort:
+            raise ValueError("cursor was issued for a different sort order")
+        for key, kinds in (fields or {}).items():
+            if key not in data or not any(_check_value(data[key], kind) for kind in kinds):
+                raise ValueError(f"cursor has an invalid {key}")
+        return data
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
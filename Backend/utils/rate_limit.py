@@ -0,0 +1,158 @@
+"""Token-bucket rate limiting for expensive endpoints such as login.
+
+A rule allows a burst of requests, refilled evenly over its period, per key:
+the client IP, the account email in the request body, or the pair of both.
+Limits are enforced by a route dependency, so a rejected request never
+reaches password hashing or the database. Rules keyed on an account refund
+successful logins, so only failed attempts count against it.
+
+The client IP is scope["client"]; behind a proxy, run uvicorn with
+--proxy-headers and --forwarded-allow-ips so it is the real client.
+"""
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from .config import settings
+from .metrics import Counter, registry
+
+RATE_LIMIT_REJECTIONS = registry.register(Counter(
+    "rate_limit_rejections_total", "Requests rejected by a rate limit rule", ("rule",)
+))
+
+class RateLimitRule:
+    def __init__(self, name: str, limit: str, key: str = "ip", refund_on_success: bool = False):
+        """limit is "<requests>/<seconds>"; key is ip, account or ip_account"""
+        requests, _, seconds = limit.partition("/")
+        self.name = name
+        self.capacity = float(requests)
+        self.refill_per_second = float(requests) / float(seconds)
+        self.key = key
+        self.refund_on_success = refund_on_success
+
+class RateLimitStore:
+    """Bucket storage; implement it over a shared store (for example a Redis
+    script) so every worker draws from the same buckets"""
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float]:
+        """Atomically take one token; returns (allowed, seconds until a token is available)"""
+        raise NotImplementedError
+
+    async def refund(self, key: str, capacity: float, refill_per_second: float) -> None:
+        """Give back a token taken for a request that turned out not to count"""
+        raise NotImplementedError
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Per-process buckets, split into shards with their own lock and LRU bound.
+
+    A full bucket is the same as a missing one, so evicting the least
+    recently used keys only forgets clients that have gone quiet.
+    """
+
+    def __init__(self, shards: int = 16, max_keys: int = 100_000):
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._max_keys_per_shard = max(max_keys // shards, 1)
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float]:
+        index = zlib.crc32(key.encode()) % len(self._shards)
+        buckets = self._shards[index]
+        now = time.monotonic()
+        with self._locks[index]:
+            tokens, updated_at = buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            buckets[key] = (tokens, now)
+            buckets.move_to_end(key)
+            while len(buckets) > self._max_keys_per_shard:
+                buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / refill_per_second
+
+    async def refund(self, key: str, capacity: float, refill_per_second: float) -> None:
+        index = zlib.crc32(key.encode()) % len(self._shards)
+        buckets = self._shards[index]
+        now = time.monotonic()
+        with self._locks[index]:
+            if key not in buckets:
+                return  # Evicted, which already means a full bucket
+            tokens, updated_at = buckets[key]
+            buckets[key] = (min(capacity, tokens + (now - updated_at) * refill_per_second + 1), now)
+
+class RateLimiter:
+    def __init__(self, store: RateLimitStore):
+        self.store = store
+
+    async def check(self, request: Request, rules: List[RateLimitRule]) -> List[Tuple[str, RateLimitRule]]:
+        """Take a token from each rule's bucket in order; raise 429 at the first empty one.
+
+        Stopping there means a client already throttled by IP does not also
+        drain the bucket of the account it is attacking. Returns the buckets
+        charged, for refund().
+        """
+        charged = []
+        if not settings.RATE_LIMIT_ENABLED:
+            return charged
+        for rule in rules:
+            subject = await _rule_subject(request, rule)
+            if subject is None:
+                continue
+            key = f"{rule.name}:{rule.key}:{subject}"
+            allowed, retry_after = await self.store.take(key, rule.capacity, rule.refill_per_second)
+            charged.append((key, rule))
+            if not allowed:
+                RATE_LIMIT_REJECTIONS.inc(f"{rule.name}:{rule.key}")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many attempts, please try again later",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+        return charged
+
+    async def refund(self, charged: List[Tuple[str, RateLimitRule]]) -> None:
+        """Return the tokens of rules that only count failures"""
+        for key, rule in charged:
+            if rule.refund_on_success:
+                await self.store.refund(key, rule.capacity, rule.refill_per_second)
+
+async def _rule_subject(request: Request, rule: RateLimitRule) -> Optional[str]:
+    ip = request.client.host if request.client else "unknown"
+    if rule.key == "ip":
+        return ip
+    # FastAPI has already read the body for the route, so this does not read it again
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    email = body.get("email") if isinstance(body, dict) else None
+    if not isinstance(email, str):
+        return None
+    email = email.strip().lower()
+    return f"{ip}|{email}" if rule.key == "ip_account" else email
+
+rate_limiter = RateLimiter(InMemoryRateLimitStore(settings.RATE_LIMIT_SHARDS, settings.RATE_LIMIT_MAX_KEYS))
+
+# Both login routes share buckets, so the admin endpoint is no way around the limit.
+# The tight per-account limit is per client too, so an attacker elsewhere cannot
+# lock the owner out; the loose account-wide one only slows distributed guessing.
+LOGIN_RULES = [
+    RateLimitRule("login", settings.RATE_LIMIT_LOGIN_PER_IP, key="ip"),
+    RateLimitRule("login", settings.RATE_LIMIT_LOGIN_PER_IP_ACCOUNT, key="ip_account", refund_on_success=True),
+    RateLimitRule("login", settings.RATE_LIMIT_LOGIN_PER_ACCOUNT, key="account", refund_on_success=True),
+]
+REGISTER_RULES = [
+    RateLimitRule("register", settings.RATE_LIMIT_REGISTER_PER_IP, key="ip"),
+]
+
+def rate_limit(rules: List[RateLimitRule]):
+    """Route dependency enforcing rules before the handler runs and refunding them when it succeeds"""
+    async def dependency(request: Request) -> AsyncIterator[None]:
+        charged = await rate_limiter.check(request, rules)
+        yield
+        # Not reached when the handler raises, e.g. 401 for a wrong password
+        await rate_limiter.refund(charged)
+    return dependency
@@ -0,0 +1,35 @@
+"""JSON responses rendered with orjson, straight from Mongo documents.
+
+orjson writes datetimes natively; ObjectId and the other BSON types it does
+not know are converted in bson_default(). Handlers that already hold plain
+documents can return BSONJSONResponse(content) themselves, which skips
+FastAPI's jsonable_encoder walk entirely. Run benchmarks/serialization.py to
+compare the two paths.
+"""
+from typing import Any
+import orjson
+from bson import Decimal128, ObjectId
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+def bson_default(value: Any) -> Any:
+    """Called by orjson for types it cannot serialize itself"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    # Naive datetimes are UTC throughout this app; orjson writes them like isoformat()
+    return orjson.dumps(content, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+
+class BSONJSONResponse(JSONResponse):
+    """Default response class; also accepts raw Mongo documents without a pydantic round trip"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
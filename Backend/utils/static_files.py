@@ -0,0 +1,188 @@
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+from email.utils import formatdate
+from typing import Optional, Tuple
+import anyio
+from fastapi import HTTPException
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from .cache import TTLCache
+from .compression import accepted_encodings
+from .conditional import etag_matches
+
+# Uploads and their derivatives are stored under their SHA-256, so a given URL
+# always serves the same bytes and browsers may cache it forever.
+# Derivatives add suffixes such as "_<params hash>_thumbnail".
+CONTENT_ADDRESSED_NAME = re.compile(r"^([0-9a-f]{64}(?:_[a-z0-9]+)*)\.[a-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+# Formats worth storing precompressed siblings for; images are already compressed
+PRECOMPRESSED_SUFFIXES = {".pdf", ".svg"}
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+CHUNK_SIZE = 64 * 1024
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Content hashes of files whose names are not content-addressed (uploads from
+# before content addressing), keyed by path, mtime and size
+_content_hashes = TTLCache(4096)
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as stored:
+        while chunk := stored.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range into (start, end) inclusive; raise 416 if unsatisfiable.
+
+    Multi-range requests return None so the whole file is served, which RFC 9110 allows.
+    """
+    match = RANGE_HEADER.match(range_header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+class UploadFileResponse(Response):
+    """File response covering a byte range.
+
+    Uses the ASGI zero-copy send extension (sendfile) when the server offers
+    it and otherwise streams chunks read off the event loop.
+    """
+
+    def __init__(self, path: str, status_code: int, headers: dict, media_type: str, offset: int, length: int):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as stored:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": stored,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+        async with await anyio.open_file(self.path, mode="rb") as stored:
+            await stored.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await stored.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # The file shrank underneath us; end the body rather than hang the client
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+class UploadStaticFiles(StaticFiles):
+    """Serves the upload directory with strong ETags, immutable caching,
+    precompressed variants and byte-range support"""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+        try:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        except PermissionError:
+            raise HTTPException(status_code=401)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+        return await self.upload_response(full_path, stat_result, scope)
+
+    async def _etag(self, full_path: str, stat_result: os.stat_result) -> Tuple[str, bool]:
+        """Strong ETag for the file and whether its URL is content-addressed"""
+        match = CONTENT_ADDRESSED_NAME.match(os.path.basename(full_path))
+        if match:
+            return f'"{match.group(1)}"', True
+        cache_key = (full_path, stat_result.st_mtime_ns, stat_result.st_size)
+        content_hash = _content_hashes.get(cache_key)
+        if content_hash is None:
+            content_hash = await anyio.to_thread.run_sync(_file_hash, full_path)
+            _content_hashes.set(cache_key, content_hash, 3600)
+        return f'"{content_hash}"', False
+
+    async def _precompressed(self, full_path: str, request_headers: Headers) -> Optional[Tuple[str, str, os.stat_result]]:
+        accepted = accepted_encodings(request_headers)
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                compressed_stat = await anyio.to_thread.run_sync(os.stat, full_path + suffix)
+            except OSError:
+                continue
+            return encoding, full_path + suffix, compressed_stat
+        return None
+
+    async def upload_response(self, full_path: str, stat_result: os.stat_result, scope: Scope) -> Response:
+        request_headers = Headers(scope=scope)
+        etag, immutable = await self._etag(full_path, stat_result)
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        headers = {
+            "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else DEFAULT_CACHE_CONTROL,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+        }
+
+        serve_path, serve_stat = full_path, stat_result
+        compressible = os.path.splitext(full_path)[1].lower() in PRECOMPRESSED_SUFFIXES
+        if compressible:
+            headers["vary"] = "Accept-Encoding"
+            # Ranges always refer to the identity encoding
+            if "range" not in request_headers:
+                precompressed = await self._precompressed(full_path, request_headers)
+                if precompressed:
+                    encoding, serve_path, serve_stat = precompressed
+                    headers["content-encoding"] = encoding
+                    etag = f'{etag[:-1]}-{encoding}"'
+        headers["etag"] = etag
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        size = serve_stat.st_size
+        byte_range = None
+        range_header = request_headers.get("range")
+        if range_header and request_headers.get("if-range", etag) == etag:
+            try:
+                byte_range = _parse_range(range_header, size)
+            except HTTPException as e:
+                e.headers = {**headers, **e.headers}
+                raise
+        if byte_range is None:
+            return UploadFileResponse(serve_path, 200, headers, media_type, 0, size)
+        start, end = byte_range
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+        return UploadFileResponse(serve_path, 206, headers, media_type, start, end - start + 1)
@@ -0,0 +1,332 @@
+import asyncio
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from .config import settings
+from .tracing import span
+
+try:
+    import brotli
+except ImportError:  # Brotli siblings are skipped; gzip ones are still written
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+
+# mkstemp creates files readable by the owner only; published files must be
+# readable by whatever serves the upload directory
+PUBLISHED_FILE_MODE = 0o644
+
+# (offset, magic bytes) of each accepted format, mapped to the extension and
+# content type we store it under. Client-supplied names and types are never trusted.
+IMAGE_SIGNATURES = {
+    (0, b"\xff\xd8\xff"): (".jpg", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n"): (".png", "image/png"),
+    (0, b"GIF87a"): (".gif", "image/gif"),
+    (0, b"GIF89a"): (".gif", "image/gif"),
+    (8, b"WEBP"): (".webp", "image/webp"),
+}
+PDF_SIGNATURES = {
+    (0, b"%PDF-"): (".pdf", "application/pdf"),
+}
+
+# Content types served from precompressed siblings; images are already compressed
+PRECOMPRESSIBLE_TYPES = {"application/pdf", "image/svg+xml"}
+
+def _detect_type(head: bytes, signatures: dict) -> Optional[tuple]:
+    for (offset, magic), file_type in signatures.items():
+        if head[offset:offset + len(magic)] == magic:
+            return file_type
+    return None
+
+class StorageBackend:
+    """Where content-addressed uploads end up; keys are "<sha256><ext>" """
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def put(self, key: str, staged_path: str, content_type: str) -> None:
+        """Store the staged file under key; the backend takes ownership of staged_path"""
+        raise NotImplementedError
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        raise NotImplementedError
+
+    async def read(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """Remove an object and any precompressed siblings"""
+        raise NotImplementedError
+
+    async def precompress(self, key: str) -> None:
+        """Store gzip/brotli encodings next to the object when the backend can serve them"""
+        return None
+
+    def url_for(self, key: str) -> str:
+        raise NotImplementedError
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        """Inverse of url_for; None if the URL does not point into this backend"""
+        raise NotImplementedError
+
+    def staging_dir(self) -> Optional[str]:
+        """Directory to stage uploads in; the same filesystem allows an atomic rename"""
+        return None
+
+class LocalStorageBackend(StorageBackend):
+    def __init__(self, directory: str, url_prefix: str, staging_directory: str):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self.staging_directory = staging_directory
+        os.makedirs(directory, exist_ok=True)
+        os.makedirs(staging_directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _publish(self, staged_path: str, path: str) -> None:
+        os.chmod(staged_path, PUBLISHED_FILE_MODE)
+        os.replace(staged_path, path)
+
+    def _write_and_publish(self, data: bytes, path: str) -> None:
+        fd, staged_path = tempfile.mkstemp(prefix=".upload-", dir=self.staging_directory)
+        try:
+            with os.fdopen(fd, "wb") as staged:
+                staged.write(data)
+            self._publish(staged_path, path)
+        except BaseException:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+            raise
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path_for(key))
+
+    async def put(self, key: str, staged_path: str, content_type: str) -> None:
+        await asyncio.to_thread(self._publish, staged_path, self.path_for(key))
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        await asyncio.to_thread(self._write_and_publish, data, self.path_for(key))
+
+    async def read(self, key: str) -> bytes:
+        def read_file():
+            with open(self.path_for(key), "rb") as stored:
+                return stored.read()
+        return await asyncio.to_thread(read_file)
+
+    async def delete(self, key: str) -> None:
+        def remove():
+            for suffix in ("", ".gz", ".br"):
+                try:
+                    os.remove(self.path_for(key) + suffix)
+                except FileNotFoundError:
+                    pass
+        await asyncio.to_thread(remove)
+
+    async def precompress(self, key: str) -> None:
+        def compress():
+            with open(self.path_for(key), "rb") as stored:
+                data = stored.read()
+            encoders = [(".gz", lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                encoders.append((".br", lambda raw: brotli.compress(raw, quality=11)))
+            for suffix, encode in encoders:
+                encoded = encode(data)
+                # Not worth serving an encoding that barely saves anything
+                if len(encoded) < len(data) * 0.95:
+                    self._write_and_publish(encoded, self.path_for(key) + suffix)
+        await asyncio.to_thread(compress)
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        prefix = f"{self.url_prefix}/"
+        if not url.startswith(prefix):
+            return None
+        key = url[len(prefix):]
+        return key if key and "/" not in key and key not in (".", "..") else None
+
+    def staging_dir(self) -> Optional[str]:
+        return self.staging_directory
+
+class S3StorageBackend(StorageBackend):
+    """Stores uploads in an S3-compatible bucket through a boto3-style client"""
+
+    def __init__(self, client, bucket: str, public_url: str):
+        self.client = client
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+    async def put(self, key: str, staged_path: str, content_type: str) -> None:
+        def upload():
+            with open(staged_path, "rb") as staged:
+                self.client.put_object(
+                    Bucket=self.bucket,
+                    Key=key,
+                    Body=staged,
+                    ContentType=content_type,
+                    CacheControl="public, max-age=31536000, immutable"
+                )
+            os.remove(staged_path)
+        await asyncio.to_thread(upload)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=key,
+            Body=io.BytesIO(data),
+            ContentType=content_type,
+            CacheControl="public, max-age=31536000, immutable"
+        )
+
+    async def read(self, key: str) -> bytes:
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=key)
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    def url_for(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        prefix = f"{self.public_url}/"
+        if not url.startswith(prefix):
+            return None
+        return url[len(prefix):] or None
+
+class LocalS3Stub:
+    """In-memory stand-in for a boto3 S3 client, for tests"""
+
+    def __init__(self):
+        self.objects: Dict[tuple, dict] = {}
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        if (Bucket, Key) not in self.objects:
+            raise KeyError(Key)
+        obj = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(obj["Body"]), "ContentType": obj["ContentType"]}
+
+    def put_object(self, Bucket: str, Key: str, Body, ContentType: str, **kwargs) -> dict:
+        self.objects[(Bucket, Key)] = {"Body": Body.read(), "ContentType": ContentType, **kwargs}
+        return {}
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        obj = self.objects[(Bucket, Key)]
+        return {"Body": io.BytesIO(obj["Body"]), "ContentType": obj["ContentType"]}
+
+    def delete_object(self, Bucket: str, Key: str) -> dict:
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+class UploadStore:
+    """Streams uploads into a storage backend, deduplicating by SHA-256 of the content"""
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+
+    async def save_image(self, upload: UploadFile) -> str:
+        return await self._save(upload, IMAGE_SIGNATURES, settings.MAX_IMAGE_UPLOAD_BYTES)
+
+    async def save_pdf(self, upload: UploadFile) -> str:
+        return await self._save(upload, PDF_SIGNATURES, settings.MAX_PDF_UPLOAD_BYTES)
+
+    async def save_images(self, uploads: list) -> list:
+        """Save several images concurrently, preserving their order"""
+        image_urls, _ = await self.save_batch(uploads)
+        return image_urls
+
+    async def save_batch(self, images: list, pdf: Optional[UploadFile] = None) -> Tuple[List[str], Optional[str]]:
+        """Save a submission's images and PDF concurrently; returns (image URLs, PDF URL).
+
+        All or nothing: if any file is rejected, the files this batch newly
+        stored are deleted again. Files that were already stored, for example
+        by another submission, are left alone.
+        """
+        created: List[str] = []
+        saves = [self._save(upload, IMAGE_SIGNATURES, settings.MAX_IMAGE_UPLOAD_BYTES, created) for upload in images]
+        if pdf is not None:
+            saves.append(self._save(pdf, PDF_SIGNATURES, settings.MAX_PDF_UPLOAD_BYTES, created))
+        # Wait for every save, so none finishes storing a file after the cleanup
+        results = await asyncio.gather(*saves, return_exceptions=True)
+        error = next((result for result in results if isinstance(result, BaseException)), None)
+        if error is not None:
+            await asyncio.gather(*(self.backend.delete(key) for key in created), return_exceptions=True)
+            raise error
+        return results[:len(images)], results[len(images)] if pdf is not None else None
+
+    async def _save(self, upload: UploadFile, signatures: dict, max_bytes: int, created: Optional[list] = None) -> str:
+        """Stream the upload to a staging file, hashing and checking limits as it goes; return its URL"""
+        with span("upload.save", filename=upload.filename or ""):
+            return await self._save_staged(upload, signatures, max_bytes, created)
+
+    async def _save_staged(self, upload: UploadFile, signatures: dict, max_bytes: int, created: Optional[list]) -> str:
+        fd, staged_path = tempfile.mkstemp(prefix=".upload-", dir=self.backend.staging_dir())
+        staged = os.fdopen(fd, "wb")
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            file_type = None
+            while chunk := await upload.read(CHUNK_SIZE):
+                if file_type is None:
+                    file_type = _detect_type(chunk, signatures)
+                    if file_type is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail=f"Unsupported file type: {upload.filename}"
+                        )
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"{upload.filename} exceeds the {max_bytes // (1024 * 1024)} MB limit"
+                    )
+                digest.update(chunk)
+                await asyncio.to_thread(staged.write, chunk)
+            await asyncio.to_thread(staged.close)
+            if file_type is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Empty file: {upload.filename}"
+                )
+
+            extension, content_type = file_type
+            key = f"{digest.hexdigest()}{extension}"
+            if await self.backend.exists(key):
+                os.remove(staged_path)
+            else:
+                await self.backend.put(key, staged_path, content_type)
+                if created is not None:
+                    created.append(key)
+                if content_type in PRECOMPRESSIBLE_TYPES:
+                    await self.backend.precompress(key)
+            return self.backend.url_for(key)
+        except BaseException:
+            staged.close()
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+            raise
+
+def _create_backend() -> StorageBackend:
+    if settings.UPLOAD_STORAGE_BACKEND == "s3":
+        import boto3  # Only needed when uploads go to object storage
+        client = boto3.client("s3", endpoint_url=settings.S3_ENDPOINT_URL or None)
+        return S3StorageBackend(client, settings.S3_BUCKET, settings.S3_PUBLIC_URL)
+    return LocalStorageBackend(
+        settings.UPLOAD_DIRECTORY, f"/{settings.UPLOAD_DIRECTORY}", settings.UPLOAD_STAGING_DIRECTORY
+    )
+
+upload_store = UploadStore(_create_backend())
@@ -0,0 +1,421 @@
+"""Request-scoped tracing and an event-loop blocking detector.
+
+The current span lives in a ContextVar. That survives awaits, tasks, and
+the executor threads Motor uses for its blocking PyMongo calls. Finished
+spans go to an exporter: structured JSON log lines, or an OTLP/JSON file
+that collectors such as the OpenTelemetry Collector's file receiver can
+ingest.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .config import settings
+from .metrics import Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "status_message")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL, start_ns: Optional[int] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    def set_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def finish(self, end_ns: Optional[int] = None):
+        self.end_ns = end_ns or time.time_ns()
+        tracer.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+class span:
+    """Time a block as a child of the current span; a no-op outside a traced request"""
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._span: Optional[Span] = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        self._span = Span(self.name, parent.trace_id, parent.span_id)
+        self._span.attributes.update(self.attributes)
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is None:
+            return False
+        _current_span.reset(self._token)
+        if exc is not None and not isinstance(exc, asyncio.CancelledError):
+            self._span.set_error(exc)
+        self._span.finish()
+        return False
+
+def traced_service(cls):
+    """Class decorator wrapping every async static method in a span named Class.method"""
+    for name, attribute in list(vars(cls).items()):
+        if not isinstance(attribute, staticmethod) or not inspect.iscoroutinefunction(attribute.__func__):
+            continue
+        setattr(cls, name, staticmethod(_traced(f"{cls.__name__}.{name}", attribute.__func__)))
+    return cls
+
+def _traced(name: str, func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _current_span.get() is None:
+            return await func(*args, **kwargs)
+        with span(name):
+            return await func(*args, **kwargs)
+    return wrapper
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_span(finished: Span) -> dict:
+    otlp = {
+        "traceId": finished.trace_id,
+        "spanId": finished.span_id,
+        "name": finished.name,
+        "kind": finished.kind,
+        "startTimeUnixNano": str(finished.start_ns),
+        "endTimeUnixNano": str(finished.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in finished.attributes.items()],
+        "status": {"code": finished.status},
+    }
+    if finished.parent_id:
+        otlp["parentSpanId"] = finished.parent_id
+    if finished.status_message:
+        otlp["status"]["message"] = finished.status_message
+    return otlp
+
+class JsonLogExporter:
+    """Writes one JSON log line per finished span"""
+
+    def __init__(self):
+        self.logger = logging.getLogger("tracing.spans")
+
+    def export(self, finished: Span):
+        self.logger.info(json.dumps({
+            "trace_id": finished.trace_id,
+            "span_id": finished.span_id,
+            "parent_id": finished.parent_id,
+            "name": finished.name,
+            "duration_ms": round(finished.duration_ms, 3),
+            "status": "error" if finished.status == STATUS_ERROR else "ok",
+            "error": finished.status_message or None,
+            **({"attributes": finished.attributes} if finished.attributes else {}),
+        }, default=str))
+
+    def shutdown(self):
+        pass
+
+class OtlpFileExporter:
+    """Appends batches of spans as OTLP/JSON ExportTraceServiceRequest lines.
+
+    Spans are handed to a writer thread so file I/O never runs on the event loop.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=10000)
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._run, name="otlp-file-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, finished: Span):
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self._dropped += 1
+
+    def _write(self, batch: List[Span]):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": settings.TRACING_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [_otlp_span(item) for item in batch]}],
+        }]}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as output:
+            output.write(json.dumps(request) + "\n")
+
+    def _run(self):
+        batch: List[Span] = []
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            if batch and (stopping or len(batch) >= self.batch_size or self._queue.empty()):
+                try:
+                    self._write(batch)
+                except OSError as e:
+                    logger.error(f"Could not write spans to {self.path}: {e}")
+                batch = []
+            if self._dropped:
+                logger.warning(f"Dropped {self._dropped} spans because the export queue was full")
+                self._dropped = 0
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+class Tracer:
+    exporter = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def export(self, finished: Span):
+        if self.exporter is not None:
+            self.exporter.export(finished)
+
+    def configure(self):
+        if settings.TRACING_EXPORTER == "json":
+            self.exporter = JsonLogExporter()
+        elif settings.TRACING_EXPORTER == "otlp-file":
+            self.exporter = OtlpFileExporter(settings.TRACING_OTLP_FILE)
+        elif settings.TRACING_EXPORTER != "none":
+            raise ValueError(f"Unknown TRACING_EXPORTER {settings.TRACING_EXPORTER!r}")
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+            self.exporter = None
+
+tracer = Tracer()
+
+class TracingMiddleware:
+    """Opens a server span per HTTP request, continuing an incoming W3C traceparent"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_id = _new_trace_id(), None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                match = TRACEPARENT.match(value.decode("latin-1").strip())
+                if match:
+                    trace_id, parent_id = match.groups()
+                break
+        server_span = Span(f"{scope['method']} {scope['path']}", trace_id, parent_id, SPAN_KIND_SERVER)
+        server_span.attributes.update({"http.method": scope["method"], "http.target": scope["path"]})
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                server_span.attributes["http.status_code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"traceparent", f"00-{trace_id}-{server_span.span_id}-01".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_span.set(server_span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            server_span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                server_span.attributes["http.route"] = route.path
+                server_span.name = f"{scope['method']} {route.path}"
+            if server_span.attributes.get("http.status_code", 500) >= 500:
+                server_span.status = STATUS_ERROR
+            server_span.finish()
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """Records a client span for each MongoDB command issued inside a traced request.
+
+    Motor runs PyMongo on executor threads with the caller's context copied,
+    so the current span is visible here.
+    """
+
+    def __init__(self):
+        self._started: Dict[tuple, Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None or not tracer.enabled:
+            return
+        command_span = Span(f"mongodb.{event.command_name}", parent.trace_id, parent.span_id, SPAN_KIND_CLIENT)
+        command_span.attributes["db.system"] = "mongodb"
+        command_span.attributes["db.name"] = event.database_name
+        collection = event.command.get(event.command_name)
+        if isinstance(collection, str):
+            command_span.attributes["db.mongodb.collection"] = collection
+        with self._lock:
+            self._started[(event.request_id, event.connection_id)] = command_span
+
+    def _finish(self, event, error: Optional[str] = None):
+        with self._lock:
+            command_span = self._started.pop((event.request_id, event.connection_id), None)
+        if command_span is None:
+            return
+        if error:
+            command_span.status = STATUS_ERROR
+            command_span.status_message = error
+        command_span.finish(command_span.start_ns + event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get("errmsg", "command failed")))
+
+mongo_command_tracer = MongoCommandTracer()
+
+EVENT_LOOP_LAG = registry.register(Histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled event loop heartbeat and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+))
+
+class LoopBlockMonitor:
+    """Detects event loop stalls and reports what the loop thread was doing.
+
+    A heartbeat callback on the loop records when it last ran. A watchdog
+    thread checks it; once the loop has been stuck past the threshold it
+    samples the loop thread's stack. When the loop recovers, the stall and
+    its distinct stack samples are logged as one JSON record and exported
+    as a span.
+    """
+
+    def __init__(self, threshold: float, interval: float):
+        self.threshold = threshold
+        self.interval = interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self.last_lag = 0.0
+        self._samples: List[List[str]] = []
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._handle = self._loop.call_later(self.interval, self._beat, self._last_beat + self.interval)
+        self._thread = threading.Thread(target=self._watch, name="loop-block-monitor", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stopping.set()
+        if self._handle is not None:
+            self._handle.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _beat(self, expected: float):
+        now = time.monotonic()
+        lag = max(now - expected, 0.0)
+        self.last_lag = lag
+        EVENT_LOOP_LAG.observe(lag)
+        samples, self._samples = self._samples, []
+        if lag >= self.threshold:
+            self._report(lag, samples)
+        self._last_beat = now
+        self._handle = self._loop.call_later(self.interval, self._beat, now + self.interval)
+
+    def _watch(self):
+        while not self._stopping.wait(self.interval / 2):
+            if time.monotonic() - self._last_beat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = [line.rstrip() for line in traceback.format_stack(frame)[-20:]]
+            # Keep distinct samples only; a loop stuck in one call repeats the same stack
+            if not self._samples or self._samples[-1] != stack:
+                self._samples.append(stack)
+
+    def _report(self, lag: float, samples: List[List[str]]):
+        logger.warning(json.dumps({
+            "event": "event_loop_blocked",
+            "blocked_ms": round(lag * 1000, 1),
+            "stack_samples": samples,
+        }))
+        if tracer.enabled:
+            blocked = Span("event_loop.blocked", _new_trace_id(), start_ns=time.time_ns() - int(lag * 1e9))
+            blocked.attributes["blocked_ms"] = round(lag * 1000, 1)
+            if samples:
+                blocked.attributes["stack"] = "".join(samples[-1])
+            blocked.finish()
+
+loop_monitor = LoopBlockMonitor(
+    settings.LOOP_BLOCK_THRESHOLD_MS / 1000,
+    settings.LOOP_MONITOR_INTERVAL_MS / 1000,
+)
@@ -24,7 +24,7 @@ const AdminDashboard = () => {
         }
 
         const data = await response.json();
-        setProjects(data);
+        setProjects(data.items);
       } catch (err) {
         setError(err.message);
       } finally {
@@ -40,13 +40,19 @@ const AdminDashboard = () => {
       setApprovingId(projectId);
       const token = localStorage.getItem('token');
       
-      const response = await fetch(`http://localhost:8000/admin/projects/${projectId}/approve`, {
+      const project = projects.find((p) => p._id === projectId);
+      const response = await fetch(`http://localhost:8000/admin/projects/${projectId}/approve?version=${project?.version ?? 0}`, {
         method: 'PUT',
         headers: {
           Authorization: `Bearer ${token}`,
         },
       });
 
+      if (response.status === 409) {
+        // Another moderator got there first; drop it from this queue
+        setProjects(projects.filter((p) => p._id !== projectId));
+        throw new Error('Project was already moderated');
+      }
       if (!response.ok) {
         throw new Error('Failed to approve project');
       }
@@ -169,10 +175,10 @@ const AdminDashboard = () => {
                           <Mail className="w-4 h-4" />
                           <span className="font-medium text-gray-900">{project.owner_email}</span>
                         </div>
-                        {project.created_at && (
+                        {project.submitted_at && (
                           <div className="flex items-center space-x-2">
                             <Clock className="w-4 h-4" />
-                            <span>Submitted {formatDate(project.created_at)}</span>
+                            <span>Submitted {formatDate(project.submitted_at)}</span>
                           </div>
                         )}
                       </div>
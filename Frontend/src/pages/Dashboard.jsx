@@ -4,6 +4,20 @@ import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { jwtDecode } from "jwt-decode";
 
+const PROJECTS_PAGE_SIZE = 24;
+// The donor count and stream endpoints take at most this many ids per request
+const MAX_IDS_PER_REQUEST = 100;
+
+// Search and the category filter are applied by the server, so later pages stay consistent
+const buildProjectsUrl = (searchQuery, category, cursor) => {
+  const query = searchQuery.trim();
+  const params = new URLSearchParams({ limit: PROJECTS_PAGE_SIZE });
+  if (query) params.set('q', query);
+  if (category !== 'All Categories') params.set('category', category);
+  if (cursor) params.set('cursor', cursor);
+  return `http://localhost:8000/projects/${query ? 'search' : ''}?${params}`;
+};
+
 const Dashboard = () => {
   const navigate = useNavigate();
   const [activeTab, setActiveTab] = useState('discover');
@@ -104,23 +118,105 @@ const Dashboard = () => {
   }, []);
 
   const [projects, setProjects] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [searchQuery, setSearchQuery] = useState('');
 
   useEffect(() => {
     const fetchProjects = async () => {
       try {
-        const response = await fetch('http://localhost:8000/projects/');
+        const response = await fetch(buildProjectsUrl(searchQuery, selectedCategory));
         if (!response.ok) {
           throw new Error('Failed to fetch projects');
         }
         const data = await response.json();
-        setProjects(data);
+        setProjects(data.items);
+        setNextCursor(data.next_cursor);
       } catch (error) {
         console.error(error);
       }
     };
 
-    fetchProjects();
-  }, [refreshProjects]);
+    // Wait for typing to pause before searching
+    const timer = setTimeout(fetchProjects, searchQuery ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [refreshProjects, searchQuery, selectedCategory]);
+
+  const loadMoreProjects = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await fetch(buildProjectsUrl(searchQuery, selectedCategory, nextCursor));
+      if (!response.ok) {
+        throw new Error('Failed to fetch projects');
+      }
+      const data = await response.json();
+      setProjects((current) => [...current, ...data.items]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error(error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const [donorCounts, setDonorCounts] = useState({});
+  const projectIds = projects.map((project) => project.id).join(',');
+
+  useEffect(() => {
+    if (!projectIds) {
+      return;
+    }
+    // One batched request per hundred cards instead of one per card
+    const fetchDonorCounts = async () => {
+      try {
+        const ids = projectIds.split(',');
+        const batches = [];
+        for (let start = 0; start < ids.length; start += MAX_IDS_PER_REQUEST) {
+          batches.push(ids.slice(start, start + MAX_IDS_PER_REQUEST).join(','));
+        }
+        const results = await Promise.all(batches.map(async (batch) => {
+          const response = await fetch(`http://localhost:8000/projects/donor-counts?ids=${batch}`);
+          if (!response.ok) {
+            throw new Error('Failed to fetch donor counts');
+          }
+          const data = await response.json();
+          return data.donor_counts;
+        }));
+        setDonorCounts(Object.assign({}, ...results));
+      } catch (error) {
+        console.error(error);
+      }
+    };
+
+    fetchDonorCounts();
+  }, [projectIds]);
+
+  useEffect(() => {
+    if (!projectIds) {
+      return;
+    }
+    // Funding totals are pushed as donations land instead of being polled;
+    // past the id limit, follow every project instead
+    const streamUrl = projectIds.split(',').length > MAX_IDS_PER_REQUEST
+      ? 'http://localhost:8000/projects/stream'
+      : `http://localhost:8000/projects/stream?ids=${projectIds}`;
+    const source = new EventSource(streamUrl);
+    const applyTotals = (event) => {
+      const update = JSON.parse(event.data);
+      const patch = (project) => project.id === update.project_id
+        ? {
+            ...project,
+            raisedAmount: update.raisedAmount ?? project.raisedAmount,
+            supportersCount: update.supportersCount ?? project.supportersCount
+          }
+        : project;
+      setProjects((current) => current.map(patch));
+      setSelectedProject((current) => (current ? patch(current) : current));
+    };
+    source.addEventListener('snapshot', applyTotals);
+    source.addEventListener('progress', applyTotals);
+    return () => source.close();
+  }, [projectIds]);
 
   const quickDonationAmounts = [10, 25, 50, 100, 250];
 
@@ -265,29 +361,21 @@ const Dashboard = () => {
   };
 
   const ProjectCard = ({ project }) => {
-    const [donorCount, setDonorCount] = useState(0);
-
-    useEffect(() => {
-      const fetchDonorCount = async () => {
-        try {
-          const response = await fetch(`http://localhost:8000/projects/${project.id}/donor-count`);
-          if (!response.ok) {
-            throw new Error('Failed to fetch donor count');
-          }
-          const data = await response.json();
-          setDonorCount(data.donor_count);
-        } catch (error) {
-          console.error(error);
-        }
-      };
-
-      fetchDonorCount();
-    }, [project.id]);
+    const donorCount = donorCounts[project.id] ?? 0;
 
     return (
       <div className="bg-white rounded-xl shadow-lg hover:shadow-xl transition-all duration-300 overflow-hidden">
         <div className="relative">
-          <img src={`http://localhost:8000${project.images[0]}`} alt={project.title} className="w-full h-48 object-cover" />
+          <img
+            src={`http://localhost:8000${project.images[0]}`}
+            srcSet={Object.entries(project.imageVariants?.[0]?.sizes || {})
+              .map(([width, urls]) => `http://localhost:8000${urls.webp} ${width}w`)
+              .join(', ') || undefined}
+            sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
+            loading="lazy"
+            alt={project.title}
+            className="w-full h-48 object-cover"
+          />
           <div className="absolute top-3 left-3 flex gap-2">
             <span className="bg-blue-600 text-white px-2 py-1 rounded-full text-xs font-semibold">
               {project.category}
@@ -532,6 +620,8 @@ const Dashboard = () => {
                 <input
                   type="text"
                   placeholder="Search projects..."
+                  value={searchQuery}
+                  onChange={(e) => setSearchQuery(e.target.value)}
                   className="w-full pl-10 pr-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                 />
               </div>
@@ -549,12 +639,21 @@ const Dashboard = () => {
 
             {/* Projects Grid */}
             <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-              {projects
-                .filter(p => selectedCategory === 'All Categories' || p.category === selectedCategory)
-                .map(project => (
-                  <ProjectCard key={project.id} project={project} />
+              {projects.map(project => (
+                <ProjectCard key={project.id} project={project} />
               ))}
             </div>
+            {nextCursor && (
+              <div className="flex justify-center mt-8">
+                <button
+                  onClick={loadMoreProjects}
+                  disabled={loadingMore}
+                  className="px-6 py-2 border border-gray-300 text-gray-700 hover:bg-gray-50 rounded-lg transition-colors disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more projects'}
+                </button>
+              </div>
+            )}
           </div>
         )}
 